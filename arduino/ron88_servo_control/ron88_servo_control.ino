@@ -1,4 +1,4 @@
-// RON 88 BOTTLE REJECTION SERVO - TIMED CONTROL
+// RON 88 BOTTLE REJECTION SERVO - TIMED CONTROL (NON-BLOCKING)
 
 
 #include <Servo.h>
@@ -8,6 +8,10 @@ Servo rejectionServo;
 // ========== PIN CONFIGURATION ==========
 const int SERVO_PIN = 9;
 
+// ========== SERIAL ==========
+// Must match arduino_baud in config/production.json
+const unsigned long BAUD_RATE = 115200;
+
 // ========== SERVO POSITIONS (degrees) ==========
 // NOTE: ADJUST THESE based on the physical setup:
 const int NORMAL_POS = 0;      // Servo resting position (away from belt)
@@ -34,110 +38,128 @@ const unsigned long DETECTION_DELAY = 5550;  // ← ADJUST THIS (milliseconds)
 const unsigned long PUSH_DURATION = 1000;     // ← ADJUST THIS (milliseconds)
 
 // NOTE: COOLDOWN: Wait time before ready for next rejection
+// (the loop keeps reading commands during the cooldown)
 const unsigned long COOLDOWN = 100;          // ← ADJUST THIS (milliseconds)
 
 // ========== REJECTION QUEUE ==========
-const int QUEUE_SIZE = 10;
-unsigned long rejectionQueue[QUEUE_SIZE];
+// NOTE: QUEUE_SIZE: Max rejections waiting for their bottle to reach the servo.
+// Needs to cover DETECTION_DELAY / (time between bottles) at full belt speed.
+const int QUEUE_SIZE = 16;                   // ← ADJUST THIS
+unsigned long rejectionQueue[QUEUE_SIZE];    // millis() when each command was received
 int queueHead = 0;
 int queueTail = 0;
 int queueCount = 0;
 
+// ========== STATUS CODES ==========
+// One short line per event so Serial.print never fills the TX buffer:
+//   RDY D<delay> P<push> C<cooldown> Q<queue size>   boot banner
+//   Q<pending>                                       rejection queued
+//   F<dropped>                                       queue full, rejection ignored
+//   G<good>                                          good bottle counted
+//   P<rejected>,<pending>                            servo pushing
+//   N                                                servo back at normal position
+//   S<good>,<rejected>,<dropped>,<pending>           session statistics
+
 // ========== STATE VARIABLES ==========
-unsigned long returnTime = 0;
-bool isPushing = false;
+enum ServoState { IDLE, PUSHING, COOLING_DOWN };
+ServoState servoState = IDLE;
+unsigned long stateSince = 0;   // millis() when the current state started
 int rejectionCount = 0;
 int goodCount = 0;
+int droppedCount = 0;
 
 // ========== SETUP ==========
 void setup() {
-  Serial.begin(9600);
+  Serial.begin(BAUD_RATE);
   rejectionServo.attach(SERVO_PIN);
   rejectionServo.write(NORMAL_POS);
 
-  // Print configuration
-  Serial.println("===== RON 88 BOTTLE REJECTION SYSTEM - READY =====");
-  Serial.print("Detection delay:  ");
+  // Configuration banner (commands: R = Reject | G = Good | S = Stats)
+  Serial.print("RDY D");
   Serial.print(DETECTION_DELAY);
-  Serial.println(" ms");
-  Serial.print("Push duration:    ");
+  Serial.print(" P");
   Serial.print(PUSH_DURATION);
-  Serial.println(" ms");
-  Serial.print("Cooldown:         ");
+  Serial.print(" C");
   Serial.print(COOLDOWN);
-  Serial.println(" ms");
-  Serial.print("Normal position:  ");
-  Serial.print(NORMAL_POS);
-  Serial.println("°");
-  Serial.print("Reject position:  ");
-  Serial.print(REJECT_POS);
-  Serial.println("°");
-  Serial.println("===== Commands: R = Reject | G = Good | S = Stats =====");
+  Serial.print(" Q");
+  Serial.println(QUEUE_SIZE);
+}
+
+// ========== COMMANDS ==========
+void handleCommand(char command, unsigned long now) {
+  if (command == 'R') {  // REJECT command (defective Ron 88 or wrong bottle)
+    if (queueCount < QUEUE_SIZE) {
+      rejectionQueue[queueTail] = now;
+      queueTail = (queueTail + 1) % QUEUE_SIZE;
+      queueCount++;
+      Serial.print('Q');
+      Serial.println(queueCount);
+    } else {
+      droppedCount++;
+      Serial.print('F');
+      Serial.println(droppedCount);
+    }
+  }
+  else if (command == 'G') {  // GOOD command (perfect Ron 88)
+    goodCount++;
+    Serial.print('G');
+    Serial.println(goodCount);
+  }
+  else if (command == 'S') {  // STATS command
+    Serial.print('S');
+    Serial.print(goodCount);
+    Serial.print(',');
+    Serial.print(rejectionCount);
+    Serial.print(',');
+    Serial.print(droppedCount);
+    Serial.print(',');
+    Serial.println(queueCount);
+  }
 }
 
 // ========== MAIN LOOP ==========
+// Never blocks: every pass drains all pending commands, then advances the servo
+// state machine. Time checks use (now - start >= duration) so they survive the
+// millis() rollover.
 void loop() {
+  unsigned long now = millis();
+
   // Check for commands from computer
-  if (Serial.available() > 0) {
-    char command = Serial.read();
-
-    if (command == 'R') {  // REJECT command (defective Ron 88 or wrong bottle)
-      if (queueCount < QUEUE_SIZE) {
-        // Add to rejection queue
-        rejectionQueue[queueTail] = millis() + DETECTION_DELAY;
-        queueTail = (queueTail + 1) % QUEUE_SIZE;
-        queueCount++;
-        Serial.print("[WARN] DEFECT/WRONG BOTTLE - Rejection queued (");
-        Serial.print(queueCount);
-        Serial.println(" pending)");
-      } else {
-        Serial.println("[FULL] Rejection queue full, ignored");
-      }
-    }
-    else if (command == 'G') {  // GOOD command (perfect Ron 88)
-      goodCount++;
-      Serial.print("[OK] Good Ron 88 bottle (#");
-      Serial.print(goodCount);
-      Serial.println(")");
-    }
-    else if (command == 'S') {  // STATS command
-      Serial.println("\n SESSION STATISTICS:");
-      Serial.print("  Good Ron 88:  ");
-      Serial.println(goodCount);
-      Serial.print("  Rejected:     ");
-      Serial.println(rejectionCount);
-      Serial.print("  Total:        ");
-      Serial.println(goodCount + rejectionCount);
-      if ((goodCount + rejectionCount) > 0) {
-        float rejectRate = (float)rejectionCount / (goodCount + rejectionCount) * 100;
-        Serial.print("  Reject rate:  ");
-        Serial.print(rejectRate, 1);
-        Serial.println("%\n");
-      }
-    }
+  while (Serial.available() > 0) {
+    handleCommand(Serial.read(), now);
   }
 
-  // Execute next queued rejection
-  if (queueCount > 0 && millis() >= rejectionQueue[queueHead] && !isPushing) {
-    // Activate servo
-    rejectionServo.write(REJECT_POS);
-    isPushing = true;
-    returnTime = millis() + PUSH_DURATION;
-    queueHead = (queueHead + 1) % QUEUE_SIZE;
-    queueCount--;
-    rejectionCount++;
-    Serial.print("[REJECT] SERVO ACTIVATED (#");
-    Serial.print(rejectionCount);
-    Serial.print(") - Pushing bottle (");
-    Serial.print(queueCount);
-    Serial.println(" still pending)");
-  }
+  switch (servoState) {
+    case IDLE:
+      // Execute next queued rejection once its bottle reaches the servo
+      if (queueCount > 0 && now - rejectionQueue[queueHead] >= DETECTION_DELAY) {
+        rejectionServo.write(REJECT_POS);
+        servoState = PUSHING;
+        stateSince = now;
+        queueHead = (queueHead + 1) % QUEUE_SIZE;
+        queueCount--;
+        rejectionCount++;
+        Serial.print('P');
+        Serial.print(rejectionCount);
+        Serial.print(',');
+        Serial.println(queueCount);
+      }
+      break;
+
+    case PUSHING:
+      // Return servo to normal position
+      if (now - stateSince >= PUSH_DURATION) {
+        rejectionServo.write(NORMAL_POS);
+        servoState = COOLING_DOWN;
+        stateSince = now;
+        Serial.println('N');
+      }
+      break;
 
-  // Return servo to normal position
-  if (isPushing && millis() >= returnTime) {
-    rejectionServo.write(NORMAL_POS);
-    isPushing = false;
-    delay(COOLDOWN);
-    Serial.println("[OK] SERVO RETURNED - Ready for next");
+    case COOLING_DOWN:
+      if (now - stateSince >= COOLDOWN) {
+        servoState = IDLE;
+      }
+      break;
   }
 }
@@ -0,0 +1,109 @@
+# RON 88 BACKGROUND WRITER
+# Bounded queue + worker thread so disk I/O never blocks the inspection loop
+
+import os
+import queue
+import threading
+
+
+def directory_size(path):
+    """Total size in bytes of all files below path"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class BackgroundWriter:
+    """
+    Write jobs to disk on a single worker thread.
+
+    submit() never blocks: when the queue is full the job is dropped and
+    counted. Subclasses implement write_job(job), which returns the number
+    of bytes written, and call reserve() before writing to honour the quota.
+    """
+
+    def __init__(self, output_dir, queue_size=32, max_bytes=None, name='writer'):
+        self.output_dir = output_dir
+        self.max_bytes = max_bytes
+        self.name = name
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.bytes_used = 0
+        self.written = 0
+        self.dropped = 0
+        self.over_quota = 0
+        self.errors = 0
+        self._thread = None
+
+    def start(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._thread = threading.Thread(target=self._worker, name=self.name, daemon=True)
+        self._thread.start()
+        return self
+
+    def submit(self, job):
+        """Queue a job without blocking. Returns False if it was dropped."""
+        if self._thread is None:
+            return False
+        try:
+            self.queue.put_nowait(job)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def close(self, timeout=10.0):
+        """Flush pending jobs and stop the worker"""
+        if self._thread is None:
+            return
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+        self._thread = None
+
+    def reserve(self, nbytes):
+        """Check the disk quota before writing nbytes. Returns False if over quota."""
+        if self.max_bytes is None or self.bytes_used + nbytes <= self.max_bytes:
+            return True
+        if self.make_room(nbytes):
+            return True
+        self.over_quota += 1
+        return False
+
+    def make_room(self, nbytes):
+        """Hook for subclasses that evict old files when the quota is reached"""
+        return False
+
+    def write_job(self, job):
+        raise NotImplementedError
+
+    def _worker(self):
+        # Measure existing files here so start-up never waits on a directory scan
+        self.bytes_used = directory_size(self.output_dir)
+        while True:
+            job = self.queue.get()
+            if job is None:
+                break
+            try:
+                nbytes = self.write_job(job)
+                if nbytes:
+                    self.bytes_used += nbytes
+                    self.written += 1
+            except Exception as e:
+                self.errors += 1
+                print(f"[WARN] {self.name}: {e}")
+
+    def stats(self):
+        return {
+            'written': self.written,
+            'dropped': self.dropped,
+            'over_quota': self.over_quota,
+            'errors': self.errors,
+            'disk_mb': self.bytes_used / (1024 * 1024),
+        }
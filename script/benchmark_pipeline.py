@@ -0,0 +1,112 @@
+# RON 88 PIPELINE BENCHMARK
+# Sweep InspectionPipeline settings over a recorded clip (headless, no Arduino)
+#
+# Example:
+#   python script/benchmark_pipeline.py --source clip.mp4 --max-frames 300 \
+#       --sweep imgsz=320,480,640 --sweep threads=2,4
+
+import argparse
+import csv
+import itertools
+import os
+import statistics
+import sys
+import time
+
+from ron88_defect_production import CONFIG_PATH, InspectionPipeline, load_config, parse_set, parse_value
+
+
+def parse_sweep(items):
+    """['imgsz=320,640', 'threads=2,4'] -> [('imgsz', [320, 640]), ('threads', [2, 4])]"""
+    sweep = []
+    for item in items:
+        key, sep, values = item.partition('=')
+        if not sep:
+            raise ValueError(f"--sweep expects KEY=V1,V2,..., got '{item}'")
+        sweep.append((key.strip(), [parse_value(v) for v in values.split(',')]))
+    return sweep
+
+
+def run_once(config):
+    pipeline = InspectionPipeline(config)
+    pipeline.start()
+    t0 = time.time()
+    pipeline.run()
+    elapsed = time.time() - t0
+    pipeline.shutdown(save_reports=False)
+
+    latencies = sorted(t * 1000 for t in pipeline.inference_times)
+    return latencies, {
+        'frames': pipeline.frames,
+        'fps': pipeline.frames / elapsed if elapsed > 0 else 0.0,
+        'latency_mean_ms': statistics.mean(latencies) if latencies else 0.0,
+        'latency_p50_ms': latencies[len(latencies) // 2] if latencies else 0.0,
+        'latency_p95_ms': latencies[int(len(latencies) * 0.95)] if latencies else 0.0,
+        'defect_pass_rate': pipeline.defect_passes / pipeline.frames if pipeline.frames else 0.0,
+        'bottles': pipeline.total_bottles,
+        'rejected': pipeline.rejected_bottles,
+        'startup_s': pipeline.startup_timings.get('total', 0.0),
+        'warmup_s': pipeline.startup_timings.get('model_warmup', 0.0),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the inspection pipeline over a grid of settings")
+    parser.add_argument('--config', default=CONFIG_PATH, help="Base JSON config file")
+    parser.add_argument('--source', required=True, help="Recorded video clip")
+    parser.add_argument('--max-frames', type=int, default=300, help="Frames per run")
+    parser.add_argument('--sweep', action='append', default=[], metavar='KEY=V1,V2',
+                        help="Config key and the values to try (repeat for a grid)")
+    parser.add_argument('--set', action='append', default=[], metavar='KEY=VALUE',
+                        help="Fixed override applied to every run")
+    parser.add_argument('--output', help="Write results to this CSV file")
+    parser.add_argument('--save-latencies', metavar='DIR',
+                        help="Write each run's per-frame latencies (ms) to DIR/latency_<setting>.txt "
+                             "for line_simulator.py --latency-file")
+    args = parser.parse_args(argv)
+
+    try:
+        sweep = parse_sweep(args.sweep)
+        base = {'source': args.source, 'max_frames': args.max_frames, 'headless': True,
+                'arduino_port': None, 'record_samples': False, 'record_evidence': False,
+                'collector_url': None}
+        base.update(parse_set(args.set))
+        keys = [key for key, _ in sweep]
+        combos = list(itertools.product(*[values for _, values in sweep]))
+        configs = [load_config(args.config, {**base, **dict(zip(keys, combo))}) for combo in combos]
+    except ValueError as e:
+        print(f"[ERROR] ERROR: {e}")
+        sys.exit(1)
+
+    rows = []
+    for combo, config in zip(combos, configs):
+        print(f"\n>>> {dict(zip(keys, combo)) or 'baseline'}")
+        latencies, result = run_once(config)
+        rows.append({**dict(zip(keys, combo)), **result})
+
+        if args.save_latencies:
+            os.makedirs(args.save_latencies, exist_ok=True)
+            setting = '_'.join(f"{key}={value}" for key, value in zip(keys, combo)) or 'baseline'
+            with open(os.path.join(args.save_latencies, f'latency_{setting}.txt'), 'w') as f:
+                f.writelines(f'{ms:.2f}\n' for ms in latencies)
+
+    # ========== RESULTS ==========
+    print("\n" + "="*70)
+    print(" BENCHMARK RESULTS")
+    print("="*70)
+    for row in rows:
+        setting = '  '.join(f"{key}={row[key]}" for key in keys) or 'baseline'
+        print(f"{setting:30s} {row['fps']:6.1f} FPS  "
+              f"mean {row['latency_mean_ms']:6.1f}ms  p95 {row['latency_p95_ms']:6.1f}ms  "
+              f"bottles {row['bottles']}  startup {row['startup_s']:.1f}s")
+
+    if args.output and rows:
+        with open(args.output, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"\n[OK] Results saved: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+# RON 88 CAMERA PROFILE
+# Camera settings saved by capture_dataset.py and applied by the production script
+
+import json
+import os
+import sys
+
+import cv2
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROFILE_PATH = os.path.join(BASE_DIR, '..', 'config', 'camera_profile.json')
+
+# Used when no profile has been saved yet (Logitech C270 via DirectShow)
+DEFAULT_PROFILE = {
+    'camera_index': 1,
+    'width': 1280,
+    'height': 720,
+    'fps': 30,
+}
+
+# Profile key -> OpenCV property, applied in this order (auto modes before manual values)
+PROPERTIES = [
+    ('autofocus', cv2.CAP_PROP_AUTOFOCUS),
+    ('auto_exposure', cv2.CAP_PROP_AUTO_EXPOSURE),
+    ('brightness', cv2.CAP_PROP_BRIGHTNESS),
+    ('contrast', cv2.CAP_PROP_CONTRAST),
+    ('exposure', cv2.CAP_PROP_EXPOSURE),
+    ('gain', cv2.CAP_PROP_GAIN),
+]
+
+
+def load_profile(path=PROFILE_PATH):
+    """Load a saved profile merged over the defaults"""
+    profile = dict(DEFAULT_PROFILE)
+    if os.path.exists(path):
+        with open(path) as f:
+            profile.update(json.load(f))
+    return profile
+
+
+def save_profile(profile, path=PROFILE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(profile, f, indent=2)
+
+
+def open_camera(profile):
+    """Open the camera and apply every setting present in the profile"""
+    # DirectShow on Windows (fast open, exposes the C270 controls); default backend elsewhere
+    backend = cv2.CAP_DSHOW if sys.platform == 'win32' else cv2.CAP_ANY
+    cap = cv2.VideoCapture(profile['camera_index'], backend)
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, profile['width'])
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, profile['height'])
+    cap.set(cv2.CAP_PROP_FPS, profile['fps'])
+    for key, prop in PROPERTIES:
+        if profile.get(key) is not None:
+            cap.set(prop, profile[key])
+    return cap
+
+
+def frame_size(cap):
+    """Negotiated frame size, read from the driver instead of grabbing a frame"""
+    return int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
@@ -1,11 +1,28 @@
 import cv2
+import numpy as np
 import os
+import re
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta
 
+from camera_profile import PROFILE_PATH, load_profile, open_camera, save_profile
+
 # ========== CONFIGURATION ==========
 # Change this for each capture session:
 category = 'underfilled'  # Options: good, underfilled, no_cap, loose_cap, debris, damaged_label, wrong_bottle
 
+# Burst / continuous capture
+BURST_FPS = 5              # Images per second while SPACEBAR is held or motion is detected
+MOTION_THRESHOLD = 12.0    # Mean pixel change inside the guide circle that counts as motion
+BURST_GAP = 1.0            # Seconds without a trigger that end a burst (next capture is a new press)
+DEDUP_DISTANCE = 4         # Max guide-circle hash distance (bits) treated as a duplicate (0 = off)
+DEDUP_HISTORY = 50         # Number of saved images of the current burst compared against
+WRITER_THREADS = 2         # Threads encoding and writing JPEGs
+MAX_PENDING_WRITES = 32    # Skip captures while this many writes are still queued
+GUIDE_RADIUS = 150
+
 # Create folders
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATASET_DIR = os.path.join(BASE_DIR, '..', 'dataset')
@@ -14,15 +31,45 @@ categories = ['good', 'underfilled', 'no_cap', 'loose_cap',
 for cat in categories:
     os.makedirs(os.path.join(DATASET_DIR, cat), exist_ok=True)
 
-# ========== CAMERA SETUP ==========
-# Logitech C270 = index 1 via DirectShow
-cap = cv2.VideoCapture(1, cv2.CAP_DSHOW)
-cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
-cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
-cap.set(cv2.CAP_PROP_AUTOFOCUS, 0)
+def next_index(cat):
+    """Resume numbering after the highest '<cat>_NNNN_*.jpg' already on disk"""
+    pattern = re.compile(rf'^{re.escape(cat)}_(\d+)_.*\.jpg$')
+    indices = [int(m.group(1)) for name in os.listdir(os.path.join(DATASET_DIR, cat))
+               if (m := pattern.match(name))]
+    return max(indices) + 1 if indices else 0
+
+def dhash(image):
+    """
+    Difference hash on a 16x16 grid, horizontal and vertical. Each neighbour step
+    is rising, falling or flat (within 2 levels), so sensor noise on flat areas
+    doesn't flip bits: near-identical images differ by 0-2 bits, a missing cap
+    or a different fill level by 10+.
+    """
+    gray = cv2.cvtColor(cv2.resize(image, (17, 17), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY).astype(int)
+    dx = gray[:16, 1:] - gray[:16, :-1]
+    dy = gray[1:, :16] - gray[:-1, :16]
+    bits = np.concatenate([(dx > 2).flatten(), (dx < -2).flatten(), (dy > 2).flatten(), (dy < -2).flatten()])
+    return sum(1 << i for i, b in enumerate(bits) if b)
+
+def duplicate_distance(image_hash):
+    """Smallest hash distance to an image saved earlier in this burst, or None if none is close enough"""
+    if DEDUP_DISTANCE <= 0 or not recent_hashes:
+        return None
+    distance = min(bin(image_hash ^ h).count('1') for h in recent_hashes)
+    return distance if distance <= DEDUP_DISTANCE else None
+
+def on_written(future, filename):
+    if future.result():
+        print(f'Saved: {filename}')
+    else:
+        print(f'[ERROR] Failed to write {filename}')
 
-# Disable auto-exposure for manual control
-cap.set(cv2.CAP_PROP_AUTO_EXPOSURE, 1)  # 1 = manual, 3 = auto
+# ========== CAMERA SETUP ==========
+# Logitech C270 = index 1 via DirectShow; settings from the last saved profile
+profile = load_profile()
+profile.setdefault('autofocus', 0)
+profile.setdefault('auto_exposure', 1)  # 1 = manual, 3 = auto (manual needed for exposure control)
+cap = open_camera(profile)
 
 if not cap.isOpened():
     print("[ERROR] Cannot open camera!")
@@ -31,27 +78,43 @@ if not cap.isOpened():
 # ========== CAMERA ADJUSTMENT TRACKBARS ==========
 cv2.namedWindow('Camera Settings')
 
-# Track which settings the user has touched
-settings_changed = {'brightness': False, 'contrast': False, 'exposure': False, 'gain': False}
+# Track which settings the user has touched (settings from a saved profile count as touched)
+settings_changed = {key: profile.get(key) is not None
+                    for key in ('brightness', 'contrast', 'exposure', 'gain')}
 
 def on_brightness(x): settings_changed['brightness'] = True
 def on_contrast(x):   settings_changed['contrast'] = True
 def on_exposure(x):   settings_changed['exposure'] = True
 def on_gain(x):       settings_changed['gain'] = True
 
-# All sliders start at middle/zero — camera keeps its own defaults until we move a slider
-cv2.createTrackbar('Brightness', 'Camera Settings', 102, 255, on_brightness)
-cv2.createTrackbar('Contrast',   'Camera Settings', 28, 255, on_contrast)
-cv2.createTrackbar('Exposure',   'Camera Settings', 0,   13,  on_exposure)   # Slider value = abs(exposure), so 6 → -6
-cv2.createTrackbar('Gain',       'Camera Settings', 0,   255, on_gain)
+# Sliders start from the saved profile, otherwise middle/zero — camera keeps its own defaults until we move a slider
+def saved(key, default):
+    """Saved profile value (0 is a valid setting), otherwise the slider default"""
+    return profile[key] if profile.get(key) is not None else default
+
+cv2.createTrackbar('Brightness', 'Camera Settings', int(saved('brightness', 102)), 255, on_brightness)
+cv2.createTrackbar('Contrast',   'Camera Settings', int(saved('contrast', 28)), 255, on_contrast)
+cv2.createTrackbar('Exposure',   'Camera Settings', int(-saved('exposure', 0)), 13,  on_exposure)   # Slider value = abs(exposure), so 6 → -6
+cv2.createTrackbar('Gain',       'Camera Settings', int(saved('gain', 0)), 255, on_gain)
 
 # ========== CAPTURE LOOP ==========
-count = 0
+count = next_index(category)
+session_count = 0
+skipped_duplicates = 0
+motion_mode = False
+last_capture_time = 0
+last_trigger_time = 0
+prev_circle = None
+recent_hashes = deque(maxlen=DEDUP_HISTORY)
+pending_writes = []
+writer = ThreadPoolExecutor(max_workers=WRITER_THREADS)
+
 print("\n" + "="*60)
-print(f"CAPTURING: {category.upper()}")
+print(f"CAPTURING: {category.upper()} (next index {count})")
 print("="*60)
 print("Controls:")
-print("  SPACEBAR = Capture image")
+print(f"  SPACEBAR = Capture image (hold for {BURST_FPS} images/s)")
+print("  M = Toggle motion-triggered capture")
 print("  Q = Quit")
 print("="*60 + "\n")
 
@@ -82,16 +145,31 @@ while True:
     h, w = frame.shape[:2]
     center_x, center_y = w // 2, h // 2
 
+    # Motion inside the guide circle (downscaled difference against the previous frame)
+    guide_crop = clean_frame[max(0, center_y - GUIDE_RADIUS):center_y + GUIDE_RADIUS,
+                             max(0, center_x - GUIDE_RADIUS):center_x + GUIDE_RADIUS]
+    circle = cv2.cvtColor(cv2.resize(guide_crop, None, fx=0.25, fy=0.25, interpolation=cv2.INTER_AREA),
+                          cv2.COLOR_BGR2GRAY)
+    motion = False
+    if prev_circle is not None and prev_circle.shape == circle.shape:
+        mask = cv2.circle(np.zeros_like(circle), (circle.shape[1] // 2, circle.shape[0] // 2),
+                          GUIDE_RADIUS // 4, 255, -1)
+        motion = cv2.mean(cv2.absdiff(circle, prev_circle), mask=mask)[0] > MOTION_THRESHOLD
+    prev_circle = circle
+
     # Draw reference guides (on display frame only)
     cv2.line(frame, (center_x, 0), (center_x, h), (0, 255, 0), 2)
     cv2.line(frame, (0, center_y), (w, center_y), (0, 255, 0), 2)
-    cv2.circle(frame, (center_x, center_y), 150, (0, 255, 0), 2)
+    cv2.circle(frame, (center_x, center_y), GUIDE_RADIUS, (0, 255, 0), 2)
 
     # Instructions overlay
     cv2.putText(frame, f"Category: {category}", (20, 40),
                 cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
     cv2.putText(frame, f"Count: {count}", (20, 80),
                 cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+    if motion_mode:
+        cv2.putText(frame, "MOTION CAPTURE", (20, 120),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255) if motion else (0, 165, 255), 2)
     cv2.putText(frame, "Center bottle in green circle", (20, h - 20),
                 cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
 
@@ -99,13 +177,41 @@ while True:
 
     key = cv2.waitKey(1) & 0xFF
 
-    if key == ord(' '):
-        timestamp = datetime.now(timezone(timedelta(hours=7))).strftime("%Y%m%d_%H%M%S")
-        filename = os.path.join(DATASET_DIR, category, f'{category}_{count:04d}_{timestamp}.jpg')
-        cv2.imwrite(filename, clean_frame)
-        count += 1
-        print(f'Saved: {filename}')
-        
+    # Holding SPACEBAR sends key repeats; each one captures, limited to BURST_FPS.
+    # Triggers less than BURST_GAP apart form a burst; only frames after the first
+    # one of a burst are checked for duplicates, so a single press always saves.
+    now = time.time()
+    triggered = key == ord(' ') or (motion_mode and motion)
+    in_burst = False
+    if triggered:
+        in_burst = now - last_trigger_time <= BURST_GAP
+        last_trigger_time = now
+        if not in_burst:
+            recent_hashes.clear()
+    if triggered and now - last_capture_time >= 1.0 / BURST_FPS:
+        pending_writes = [f for f in pending_writes if not f.done()]
+        # Hash only the guide circle, where the bottle is, so a different bottle never looks the same
+        image_hash = dhash(guide_crop)
+        distance = duplicate_distance(image_hash) if in_burst else None
+        if distance is not None:
+            skipped_duplicates += 1
+            print(f"[SKIP] Same as a frame earlier in this burst (hash distance {distance}), not saved")
+        elif len(pending_writes) >= MAX_PENDING_WRITES:
+            print("[WARN] Writer busy, frame skipped")
+        else:
+            last_capture_time = now
+            recent_hashes.append(image_hash)
+            timestamp = datetime.now(timezone(timedelta(hours=7))).strftime("%Y%m%d_%H%M%S")
+            filename = os.path.join(DATASET_DIR, category, f'{category}_{count:04d}_{timestamp}.jpg')
+            future = writer.submit(cv2.imwrite, filename, clean_frame)
+            future.add_done_callback(lambda f, name=filename: on_written(f, name))
+            pending_writes.append(future)
+            count += 1
+            session_count += 1
+
+    if key == ord('m'):
+        motion_mode = not motion_mode
+        print(f"Motion capture {'ON' if motion_mode else 'OFF'}")
     elif key == ord('q'):
         break
 
@@ -117,9 +223,20 @@ final_gain       = cv2.getTrackbarPos('Gain', 'Camera Settings')
 
 cap.release()
 cv2.destroyAllWindows()
-print(f"\nSession complete! Total captured: {count} images")
+writer.shutdown(wait=True)
+print(f"\nSession complete! Captured this session: {session_count} images "
+      f"({count} in '{category}', {skipped_duplicates} duplicates skipped)")
 print(f"\nFinal camera settings:")
 print(f"   Brightness: {final_brightness}")
 print(f"   Contrast:   {final_contrast}")
 print(f"   Exposure:   -{final_exposure}")
-print(f"   Gain:       {final_gain}\n")
\ No newline at end of file
+print(f"   Gain:       {final_gain}\n")
+
+# Persist the settings the user actually applied so the production script can reuse them
+final_values = {'brightness': final_brightness, 'contrast': final_contrast,
+                'exposure': -final_exposure, 'gain': final_gain}
+for key, value in final_values.items():
+    if settings_changed[key]:
+        profile[key] = value
+save_profile(profile)
+print(f"Camera profile saved: {os.path.abspath(PROFILE_PATH)}\n")
@@ -0,0 +1,200 @@
+# RON 88 COLLECTOR
+# Central store for per-bottle records pushed by the inspection stations
+#
+# Stations POST gzip-compressed JSON batches to /records; the dashboard queries
+# /records and /stations. Everything lives in one SQLite file.
+#
+# Example:
+#   python script/collector.py --port 8765
+#   python script/ron88_defect_production.py --set collector_url=http://127.0.0.1:8765 --set station_id=line1
+
+import argparse
+import gzip
+import json
+import os
+import sqlite3
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_PATH = os.path.join(ROOT_DIR, 'inference_result', 'collector.db')
+DEFAULT_PORT = 8765
+
+RECORD_FIELDS = ['station', 'session', 'seq', 'bottle_id', 'timestamp', 'bottle_number',
+                 'result', 'bottle_type', 'defects', 'evidence']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bottles (
+    station TEXT NOT NULL,
+    session TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    bottle_id TEXT,
+    timestamp TEXT,
+    bottle_number INTEGER,
+    result TEXT,
+    bottle_type TEXT,
+    defects TEXT,
+    evidence TEXT,
+    PRIMARY KEY (station, session, seq)
+);
+CREATE INDEX IF NOT EXISTS idx_bottles_timestamp ON bottles (timestamp);
+CREATE INDEX IF NOT EXISTS idx_bottles_station_timestamp ON bottles (station, timestamp);
+CREATE INDEX IF NOT EXISTS idx_bottles_result ON bottles (result, timestamp);
+"""
+
+
+class RecordStore:
+    """
+    SQLite store shared by the request threads.
+
+    (station, session, seq) is unique, so a batch that is retried after a
+    lost response is not counted twice.
+    """
+
+    def __init__(self, path=DB_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.executescript(SCHEMA)
+        self.lock = threading.Lock()
+
+    def insert(self, records):
+        """Insert a batch; returns the number of new rows"""
+        rows = [tuple(record.get(field) for field in RECORD_FIELDS) for record in records]
+        with self.lock, self.db:
+            before = self.db.total_changes
+            self.db.executemany(
+                f"INSERT OR IGNORE INTO bottles ({', '.join(RECORD_FIELDS)}) "
+                f"VALUES ({', '.join('?' * len(RECORD_FIELDS))})", rows)
+            return self.db.total_changes - before
+
+    def query(self, stations=None, start=None, end=None, result=None, limit=50000):
+        """Records filtered by station list, timestamp range [start, end] and result, newest first"""
+        where, params = [], []
+        if stations:
+            where.append(f"station IN ({', '.join('?' * len(stations))})")
+            params.extend(stations)
+        if start:
+            where.append('timestamp >= ?')
+            params.append(start)
+        if end:
+            where.append('timestamp <= ?')
+            params.append(end)
+        if result:
+            where.append('result = ?')
+            params.append(result)
+        sql = f"SELECT {', '.join(RECORD_FIELDS)} FROM bottles"
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY timestamp DESC, seq DESC LIMIT ?'
+        params.append(limit)
+        with self.lock:
+            return [dict(row) for row in self.db.execute(sql, params)]
+
+    def stations(self):
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT station, COUNT(*) AS bottles, SUM(result = 'REJECT') AS rejected, "
+                "MAX(timestamp) AS last_seen FROM bottles GROUP BY station ORDER BY station")
+            return [dict(row) for row in rows]
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+class CollectorHandler(BaseHTTPRequestHandler):
+    """POST /records (gzip JSON), GET /records, GET /stations, GET /health"""
+
+    store = None  # Set by make_server()
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if urlparse(self.path).path != '/records':
+            self._send_json(404, {'error': 'not found'})
+            return
+        try:
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            if self.headers.get('Content-Encoding') == 'gzip':
+                body = gzip.decompress(body)
+            batch = json.loads(body)
+            records = [{**record, 'station': batch['station']} for record in batch['records']]
+            if any(record.get('session') is None or record.get('seq') is None for record in records):
+                raise ValueError('every record needs session and seq')
+        except (ValueError, KeyError, TypeError, OSError) as e:
+            self._send_json(400, {'error': f'bad batch: {e}'})
+            return
+        inserted = self.store.insert(records)
+        self._send_json(200, {'received': len(records), 'inserted': inserted})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        if url.path == '/health':
+            self._send_json(200, {'status': 'ok'})
+        elif url.path == '/stations':
+            self._send_json(200, {'stations': self.store.stations()})
+        elif url.path == '/records':
+            try:
+                limit = int(params.get('limit', ['50000'])[0])
+            except ValueError:
+                self._send_json(400, {'error': 'limit must be an integer'})
+                return
+            records = self.store.query(stations=params.get('station'),
+                                       start=params.get('start', [None])[0],
+                                       end=params.get('end', [None])[0],
+                                       result=params.get('result', [None])[0],
+                                       limit=limit)
+            self._send_json(200, {'records': records})
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def log_message(self, format, *args):
+        # One line per request would flood the console at line rate
+        pass
+
+
+def make_server(host, port, store):
+    handler = type('Handler', (CollectorHandler,), {'store': store})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Collect inspection records from all stations")
+    parser.add_argument('--host', default='127.0.0.1', help="Address to listen on")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--db', default=DB_PATH, help="SQLite database file")
+    args = parser.parse_args(argv)
+
+    store = RecordStore(args.db)
+    server = make_server(args.host, args.port, store)
+    print("="*70)
+    print(" RON 88 COLLECTOR")
+    print("="*70)
+    print(f"Listening on http://{args.host}:{args.port}")
+    print(f"Database:    {os.path.abspath(args.db)}")
+    for station in store.stations():
+        print(f"   {station['station']:15s} {station['bottles']:6d} bottles  last seen {station['last_seen']}")
+    print("Press Ctrl+C to stop")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        store.close()
+        print("\n[OK] Collector stopped")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+# RON 88 COLLECTOR CLIENT
+# Batches per-bottle records and pushes them to the collector, spooling to disk while it is unreachable
+
+import gzip
+import json
+import os
+import queue
+import time
+import urllib.error
+import urllib.request
+
+from background_writer import BackgroundWriter, directory_size
+
+
+class CollectorClient(BackgroundWriter):
+    """
+    Push records to the collector in gzip-compressed JSON batches.
+
+    send() never blocks (records are dropped when the queue is full). The
+    worker sends a batch when batch_size records are waiting or flush_interval
+    seconds have passed. A batch that cannot be delivered is written to
+    <spool_dir>/batch_<time>_<seq>.json.gz and re-sent, oldest first, once the
+    collector answers again. While it is down, delivery is only retried every
+    retry_interval seconds. At the spool quota the oldest batches are deleted.
+
+    Spool files start with a '<record count>\n' header line followed by the
+    compressed batch. They are written to a .tmp name and renamed into place,
+    so a crash never leaves a half-written batch; a file that still fails to
+    decode is renamed to .bad and skipped.
+    """
+
+    def __init__(self, url, station, spool_dir, batch_size=50, flush_interval=2.0,
+                 retry_interval=10.0, timeout=5.0, queue_size=1000, max_bytes=None):
+        super().__init__(spool_dir, queue_size=queue_size, max_bytes=max_bytes,
+                         name='collector-client')
+        self.url = url.rstrip('/') + '/records'
+        self.station = station
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retry_interval = retry_interval
+        self.timeout = timeout
+        self.sent = 0
+        self.evicted = 0
+        self._retry_at = 0
+        self._seq = 0
+
+    def send(self, record):
+        """Queue one record without blocking. Returns False if it was dropped."""
+        return self.submit(record)
+
+    # ========== DELIVERY ==========
+
+    def _post(self, data):
+        request = urllib.request.Request(self.url, data=data, method='POST', headers={
+            'Content-Type': 'application/json', 'Content-Encoding': 'gzip'})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+    def _deliver(self, data, count):
+        """
+        Try to send one compressed batch of count records. Returns False if the
+        collector is unreachable and the batch should be kept for later.
+        """
+        if time.time() < self._retry_at:
+            return False
+        try:
+            self._post(data)
+            self.sent += count
+            return True
+        except urllib.error.HTTPError as e:
+            if e.code < 500:
+                # The collector will never accept this batch; retrying would block the spool
+                self.errors += 1
+                print(f"[WARN] {self.name}: batch rejected by collector ({e}), discarded")
+                return True
+            print(f"[WARN] {self.name}: collector error ({e}), spooling to disk")
+            self._retry_at = time.time() + self.retry_interval
+            return False
+        except OSError as e:
+            # URLError, connection refused and timeouts
+            print(f"[WARN] {self.name}: collector unreachable ({e}), spooling to disk")
+            self._retry_at = time.time() + self.retry_interval
+            return False
+
+    def _spool_files(self):
+        return sorted(name for name in os.listdir(self.output_dir) if name.endswith('.json.gz'))
+
+    def _read_spool_file(self, path):
+        """Returns (count, data); raises ValueError if the file is damaged"""
+        with open(path, 'rb') as f:
+            header, _, data = f.read().partition(b'\n')
+        if not header.isdigit():
+            raise ValueError('missing record count header')
+        count = int(header)
+        try:
+            # Checks the gzip CRC and length, so a truncated batch is caught here
+            gzip.decompress(data)
+        except (OSError, EOFError) as e:
+            raise ValueError(f'corrupt batch: {e}')
+        return count, data
+
+    def _drain_spool(self):
+        """Re-send spooled batches, oldest first, until one fails"""
+        for name in self._spool_files():
+            path = os.path.join(self.output_dir, name)
+            size = os.path.getsize(path)
+            try:
+                count, data = self._read_spool_file(path)
+            except ValueError as e:
+                self.errors += 1
+                print(f"[WARN] {self.name}: {name}: {e}, moved aside as .bad")
+                os.replace(path, path + '.bad')
+                self.bytes_used -= size
+                continue
+            if not self._deliver(data, count):
+                return
+            os.remove(path)
+            self.bytes_used -= size
+
+    def write_job(self, batch):
+        data = gzip.compress(json.dumps({'station': self.station, 'records': batch}).encode())
+
+        # Keep batches in order: older spooled batches go out first. The new batch
+        # is spooled even if draining fails, so it is never lost.
+        try:
+            self._drain_spool()
+        except Exception as e:
+            self.errors += 1
+            print(f"[WARN] {self.name}: spool drain failed ({e})")
+        if not self._spool_files() and self._deliver(data, len(batch)):
+            return 0
+
+        content = f'{len(batch)}\n'.encode() + data
+        if not self.reserve(len(content)):
+            return 0
+        self._seq += 1
+        path = os.path.join(self.output_dir, f'batch_{time.strftime("%Y%m%d_%H%M%S")}_{self._seq:06d}.json.gz')
+        with open(path + '.tmp', 'wb') as f:
+            f.write(content)
+        os.replace(path + '.tmp', path)
+        return len(content)
+
+    def make_room(self, nbytes):
+        """Delete the oldest spooled batches until nbytes fit in the quota"""
+        for name in self._spool_files():
+            if self.bytes_used + nbytes <= self.max_bytes:
+                break
+            path = os.path.join(self.output_dir, name)
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+            except OSError:
+                continue
+            self.bytes_used -= size
+            self.evicted += 1
+        return self.bytes_used + nbytes <= self.max_bytes
+
+    def _worker(self):
+        # Leftovers from a crash mid-write; the batch in them was never acknowledged as spooled
+        for name in os.listdir(self.output_dir):
+            if name.endswith('.tmp'):
+                os.remove(os.path.join(self.output_dir, name))
+        self.bytes_used = directory_size(self.output_dir)
+        batch = []
+        deadline = time.time() + self.flush_interval
+        done = False
+        while not done:
+            try:
+                record = self.queue.get(timeout=max(0.0, deadline - time.time()))
+                if record is None:
+                    done = True
+                else:
+                    batch.append(record)
+            except queue.Empty:
+                pass
+
+            if done or len(batch) >= self.batch_size or time.time() >= deadline:
+                try:
+                    if batch:
+                        nbytes = self.write_job(batch)
+                        if nbytes:
+                            self.bytes_used += nbytes
+                            self.written += 1
+                    elif self._spool_files():
+                        self._drain_spool()
+                except Exception as e:
+                    self.errors += 1
+                    print(f"[WARN] {self.name}: {e}")
+                batch = []
+                deadline = time.time() + self.flush_interval
+
+    def stats(self):
+        stats = super().stats()
+        # written counts batches that went to the spool instead of the collector
+        stats.update(sent=self.sent, spooled=self.written, evicted=self.evicted,
+                     pending_batches=len(self._spool_files()))
+        return stats
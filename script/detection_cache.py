@@ -0,0 +1,353 @@
+# RON 88 DETECTION CACHE
+# Run the detector once, then sweep thresholds / accumulation against the cached detections
+#
+# Examples:
+#   python script/detection_cache.py build --source clip.mp4 --output cache/clip.npz
+#   python script/detection_cache.py build --source dataset --output cache/dataset.npz
+#   python script/detection_cache.py sweep cache/clip.npz --labels clip_labels.csv \
+#       --sweep bottle_confidence=0.6,0.65,0.7,0.75 --sweep defect_confidence=0.4,0.5,0.6 \
+#       --sweep accumulation_frames=3,5,7
+#
+# Clip labels CSV: one row per bottle with the frame where it is centered in the zone,
+#   frame,result,defects
+#   412,REJECT,LOW_FILL + DEBRIS
+#   498,PASS,
+
+import argparse
+import contextlib
+import csv
+import io
+import itertools
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from benchmark_pipeline import parse_sweep
+from ron88_defect_production import (BOTTLE_CLASSES, CONFIG_PATH, DEFAULT_CONFIG, DEFECT_LABELS,
+                                     InspectionPipeline, load_config, parse_set)
+
+# Dataset folder (see capture_dataset.py) -> labels the bottle should be rejected for
+CATEGORY_LABELS = {
+    'good': set(),
+    'underfilled': {'LOW_FILL'},
+    'no_cap': {'NO_CAP'},
+    'loose_cap': {'LOOSE_CAP'},
+    'debris': {'DEBRIS'},
+    'damaged_label': {'LABEL_DMG'},
+    'wrong_bottle': {'WRONG_BRAND'},
+}
+
+REPORT_LABELS = ['WRONG_BRAND'] + [label for _, label in DEFECT_LABELS.values()]
+
+# Decide what ends up in the cache, so sweeping them replays identical detections
+BUILD_KEYS = ['model_path', 'imgsz', 'predict_confidence', 'cascade', 'localizer_model_path',
+              'localizer_imgsz', 'defect_imgsz', 'crop_padding', 'center_tolerance']
+
+
+# ========== BUILD ==========
+
+def iter_clip(path):
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise RuntimeError(f"Cannot open {path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    index = 0
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        yield frame, index / fps, 0, ''
+        index += 1
+    cap.release()
+
+
+def iter_dataset(path):
+    """Every image in the category folders; each image is its own group"""
+    group = 0
+    for category in sorted(CATEGORY_LABELS):
+        folder = os.path.join(path, category)
+        if not os.path.isdir(folder):
+            continue
+        for name in sorted(os.listdir(folder)):
+            if not name.lower().endswith(('.jpg', '.jpeg', '.png')):
+                continue
+            frame = cv2.imread(os.path.join(folder, name))
+            if frame is None:
+                continue
+            yield frame, 0.0, group, category
+            group += 1
+
+
+def build(args, config):
+    is_dataset = os.path.isdir(args.source)
+    frames = iter_dataset(args.source) if is_dataset else iter_clip(args.source)
+
+    pipeline = InspectionPipeline(config)
+    frame_offsets, times, groups, categories, inspected = [0], [], [], [], []
+    cls, conf, xyxy = [], [], []
+    frame_shape = None
+    t0 = time.time()
+
+    for frame, t, group, category in frames:
+        if pipeline.model is None:
+            frame_shape = frame.shape[:2]
+            pipeline.set_frame_size(frame_shape[1], frame_shape[0])
+            pipeline.load_model(frame_shape[1], frame_shape[0])
+        for class_id, confidence, box in pipeline.detect(frame):
+            cls.append(class_id)
+            conf.append(confidence)
+            xyxy.append(box)
+        frame_offsets.append(len(cls))
+        # With the cascade, a frame that skipped the defect pass must not count as a clean look
+        inspected.append(not pipeline.defect_pass_skipped)
+        times.append(t)
+        groups.append(group)
+        if group == len(categories):
+            categories.append(category)
+        if len(times) % 100 == 0:
+            print(f"   {len(times)} frames ({len(times) / (time.time() - t0):.1f} FPS)")
+
+    if frame_shape is None:
+        raise RuntimeError(f"No frames found in {args.source}")
+
+    meta = {
+        'source': os.path.abspath(args.source),
+        'kind': 'dataset' if is_dataset else 'clip',
+        'model_path': config['model_path'],
+        'imgsz': config['imgsz'],
+        'cascade': config['cascade'],
+        'conf_floor': config['predict_confidence'],
+        'frame_width': frame_shape[1],
+        'frame_height': frame_shape[0],
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    np.savez_compressed(
+        args.output,
+        frame_offsets=np.array(frame_offsets, dtype=np.int32),
+        times=np.array(times, dtype=np.float64),
+        inspected=np.array(inspected, dtype=bool),
+        groups=np.array(groups, dtype=np.int32),
+        categories=np.array(categories),
+        cls=np.array(cls, dtype=np.uint8),
+        # float32 is what the model outputs; anything coarser can move a score across a threshold
+        conf=np.array(conf, dtype=np.float32),
+        xyxy=np.array(xyxy, dtype=np.int16).reshape(-1, 4),
+        meta=np.array(json.dumps(meta)),
+    )
+    print(f"\n[OK] {len(times)} frames, {len(cls)} detections cached in {time.time() - t0:.0f}s: {args.output}")
+
+
+# ========== SWEEP ==========
+
+def load_cache(path):
+    data = np.load(path)
+    meta = json.loads(str(data['meta']))
+    offsets = data['frame_offsets']
+    cls, conf, xyxy = data['cls'].tolist(), data['conf'].astype(float).tolist(), data['xyxy'].tolist()
+    frames = [[(cls[i], conf[i], tuple(xyxy[i])) for i in range(offsets[k], offsets[k + 1])]
+              for k in range(len(offsets) - 1)]
+    # Caches built before the cascade flag was stored ran the defect pass on every frame
+    inspected = data['inspected'].tolist() if 'inspected' in data else [True] * len(frames)
+    return (meta, frames, data['times'].tolist(), data['groups'].tolist(), data['categories'].tolist(),
+            inspected)
+
+
+def load_clip_labels(path):
+    truth = []
+    with open(path, newline='') as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            labels = {d.strip() for d in (row.get('defects') or '').split('+') if d.strip()}
+            result = (row.get('result') or '').strip().upper()
+            if result != ('REJECT' if labels else 'PASS'):
+                raise ValueError(f"{path} line {reader.line_num}: result '{row.get('result')}' "
+                                 f"does not match defects '{row.get('defects') or ''}'")
+            truth.append({'frame': int(row['frame']), 'labels': labels})
+    return truth
+
+
+def decision_labels(decision):
+    return {d.strip() for d in decision['defects'].split('+') if d.strip()}
+
+
+def replay_clip(pipeline, frames, times, inspected):
+    """Decisions as (frame index, labels, frames from first sighting to decision)"""
+    decisions = []
+    first_seen = None
+    armed = True
+    for index, (detections, t, looked) in enumerate(zip(frames, times, inspected)):
+        decision, all_boxes = pipeline.process(detections, t, inspected=looked)
+        bottle_seen = any(b['class_id'] in BOTTLE_CLASSES for b in all_boxes)
+        # Re-arm once the zone is empty, so the next sighting belongs to a new bottle
+        if not bottle_seen:
+            armed = True
+        elif armed and first_seen is None:
+            first_seen = index
+        if decision:
+            start = first_seen if first_seen is not None else index
+            decisions.append((index, decision_labels(decision), index - start + 1))
+            first_seen, armed = None, False
+    return decisions
+
+
+def match_clip(decisions, truth, window):
+    """Pair each labelled bottle with the nearest unused decision within window frames"""
+    pairs = []
+    used = set()
+    for bottle in truth:
+        candidates = [(abs(index - bottle['frame']), k) for k, (index, _, _) in enumerate(decisions)
+                      if k not in used and abs(index - bottle['frame']) <= window]
+        if candidates:
+            _, k = min(candidates)
+            used.add(k)
+            pairs.append((bottle['labels'], decisions[k][1], decisions[k][2]))
+        else:
+            pairs.append((bottle['labels'], None, None))
+    return pairs, len(decisions) - len(used)
+
+
+def replay_dataset(pipeline, frames, groups, categories, inspected):
+    """One decision per image: accumulation of 1 frame, no cooldown"""
+    pairs = []
+    for index, (detections, group, looked) in enumerate(zip(frames, groups, inspected)):
+        decision, _ = pipeline.process(detections, float(index + 1), inspected=looked)
+        pairs.append((CATEGORY_LABELS[categories[group]],
+                      decision_labels(decision) if decision else None, 1 if decision else None))
+    return pairs, 0
+
+
+def score(pairs, spurious):
+    """Per-class precision/recall, false-reject rate and frames-to-decision for (truth, predicted) pairs"""
+    result = {}
+    for label in REPORT_LABELS:
+        tp = sum(1 for truth, pred, _ in pairs if pred is not None and label in truth and label in pred)
+        fp = sum(1 for truth, pred, _ in pairs if pred is not None and label not in truth and label in pred)
+        fn = sum(1 for truth, pred, _ in pairs if label in truth and (pred is None or label not in pred))
+        result[f'{label}_precision'] = tp / (tp + fp) if tp + fp else None
+        result[f'{label}_recall'] = tp / (tp + fn) if tp + fn else None
+
+    good = [pred for truth, pred, _ in pairs if not truth]
+    bad = [pred for truth, pred, _ in pairs if truth]
+    result['false_reject_rate'] = sum(1 for pred in good if pred) / len(good) if good else 0.0
+    result['reject_recall'] = sum(1 for pred in bad if pred) / len(bad) if bad else 1.0
+    result['undecided'] = sum(1 for _, pred, _ in pairs if pred is None)
+    result['spurious'] = spurious
+    frames_to_decision = [n for _, pred, n in pairs if n is not None]
+    result['avg_frames_to_decision'] = (sum(frames_to_decision) / len(frames_to_decision)
+                                        if frames_to_decision else None)
+    return result
+
+
+def sweep(args, config):
+    grid = parse_sweep(args.sweep)
+    keys = [key for key, _ in grid]
+    unknown = set(keys) - set(DEFAULT_CONFIG)
+    if unknown:
+        raise ValueError(f"Unknown config keys: {', '.join(sorted(unknown))}")
+
+    meta, frames, times, groups, categories, inspected = load_cache(args.cache)
+    is_dataset = meta['kind'] == 'dataset'
+    truth = None
+    if not is_dataset:
+        if not args.labels:
+            raise ValueError("Clip caches need --labels (frame,result,defects per bottle)")
+        truth = load_clip_labels(args.labels)
+
+    if is_dataset and 'accumulation_frames' in keys:
+        print("[WARN] accumulation_frames has no effect on dataset caches (one image per bottle)")
+    fixed = [key for key in BUILD_KEYS if key in keys]
+    if fixed:
+        print(f"[WARN] Fixed when the cache is built, no effect in a sweep: {', '.join(fixed)}")
+
+    rows = []
+    t0 = time.time()
+    for combo in itertools.product(*[values for _, values in grid]):
+        overrides = dict(zip(keys, combo))
+        if is_dataset:
+            overrides.update(accumulation_frames=1, detection_cooldown=0)
+        pipeline = InspectionPipeline({**config, **overrides})
+        pipeline.set_frame_size(meta['frame_width'], meta['frame_height'])
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            if is_dataset:
+                pairs, spurious = replay_dataset(pipeline, frames, groups, categories, inspected)
+            else:
+                decisions = replay_clip(pipeline, frames, times, inspected)
+                pairs, spurious = match_clip(decisions, truth, args.match_window)
+        rows.append({**dict(zip(keys, combo)), **score(pairs, spurious)})
+
+    elapsed = time.time() - t0
+    rows.sort(key=lambda r: (-r['reject_recall'], r['false_reject_rate'], r['undecided'] + r['spurious']))
+
+    print("="*70)
+    print(f" SWEEP RESULTS ({len(rows)} combinations over {len(frames)} cached frames in {elapsed:.1f}s)")
+    print("="*70)
+    fmt = lambda v: '  -  ' if v is None else f'{v:5.2f}'
+    for row in rows[:args.top]:
+        setting = '  '.join(f"{key}={row[key]}" for key in keys) or 'baseline'
+        print(f"{setting:50s} reject recall {fmt(row['reject_recall'])}  "
+              f"false reject {fmt(row['false_reject_rate'])}  "
+              f"frames {fmt(row['avg_frames_to_decision'])}  "
+              f"undecided {row['undecided']}  spurious {row['spurious']}")
+
+    if rows:
+        print("\nBest combination per class:")
+        for label in REPORT_LABELS:
+            print(f"  {label:12s} precision {fmt(rows[0][f'{label}_precision'])}  "
+                  f"recall {fmt(rows[0][f'{label}_recall'])}")
+
+    if args.output and rows:
+        with open(args.output, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"\n[OK] Results saved: {args.output}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cache detections once, then sweep decision parameters")
+    parser.add_argument('--config', default=CONFIG_PATH, help="Production JSON config")
+    parser.add_argument('--set', action='append', default=[], metavar='KEY=VALUE',
+                        help="Override a production config key")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = sub.add_parser('build', help="Run the detector over a clip or dataset folder")
+    build_parser.add_argument('--source', required=True, help="Video clip or dataset folder (category subfolders)")
+    build_parser.add_argument('--output', required=True, help="Cache file (.npz)")
+    build_parser.add_argument('--conf-floor', type=float, default=0.1,
+                              help="Lowest confidence kept, so thresholds can be swept below production's")
+
+    sweep_parser = sub.add_parser('sweep', help="Re-run the decision logic over a cache")
+    sweep_parser.add_argument('cache', help="Cache file from 'build'")
+    sweep_parser.add_argument('--labels', help="Ground truth CSV for clip caches")
+    sweep_parser.add_argument('--sweep', action='append', default=[], metavar='KEY=V1,V2',
+                              help="Config key and the values to try (repeat for a grid)")
+    sweep_parser.add_argument('--match-window', type=int, default=30,
+                              help="Max frames between a labelled bottle and its decision")
+    sweep_parser.add_argument('--top', type=int, default=15, help="Rows to print")
+    sweep_parser.add_argument('--output', help="Write all results to this CSV file")
+    args = parser.parse_args(argv)
+
+    try:
+        overrides = {'arduino_port': None, 'record_samples': False, 'record_evidence': False,
+                     'collector_url': None, 'warmup_runs': 0}
+        overrides.update(parse_set(args.set))
+        if args.command == 'build':
+            overrides['predict_confidence'] = args.conf_floor
+        config = load_config(args.config, overrides)
+
+        if args.command == 'build':
+            build(args, config)
+        else:
+            sweep(args, config)
+    except (ValueError, RuntimeError) as e:
+        print(f"[ERROR] ERROR: {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+# RON 88 EVIDENCE RECORDER
+# Writes an image strip of the zone crops around each decision, named by bottle_id and number
+
+import os
+
+import cv2
+import numpy as np
+
+from background_writer import BackgroundWriter
+
+RESULT_COLORS = {'REJECT': (0, 0, 255), 'PASS': (0, 255, 0)}
+
+
+class EvidenceRecorder(BackgroundWriter):
+    """
+    Encode evidence strips for decided bottles.
+
+    Each job is (name, caption, result, frames, decision_index): the zone
+    crops around the decision, oldest first, and the index of the frame the
+    decision was made on. Output is <output_dir>/<name>.jpg. When the quota
+    is reached the oldest strips are deleted to make room.
+    """
+
+    def __init__(self, output_dir, height=240, queue_size=8, max_bytes=None):
+        super().__init__(output_dir, queue_size=queue_size, max_bytes=max_bytes,
+                         name='evidence-recorder')
+        self.height = height
+        self.evicted = 0
+
+    def record(self, name, caption, result, frames, decision_index):
+        """Queue one strip. Returns True if it was queued."""
+        if not frames:
+            return False
+        return self.submit((name, caption, result, frames, decision_index))
+
+    def write_job(self, job):
+        name, caption, result, frames, decision_index = job
+        color = RESULT_COLORS.get(result, (255, 255, 255))
+
+        tiles = []
+        for i, crop in enumerate(frames):
+            h, w = crop.shape[:2]
+            tile = cv2.resize(crop, (max(1, w * self.height // h), self.height))
+            offset = i - decision_index
+            cv2.putText(tile, f'{offset:+d}' if offset else 'DECISION', (6, 20),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, color if offset == 0 else (255, 255, 255), 1)
+            if offset == 0:
+                cv2.rectangle(tile, (0, 0), (tile.shape[1] - 1, tile.shape[0] - 1), color, 3)
+            tiles.append(tile)
+
+        strip = np.hstack(tiles)
+        header = np.zeros((30, strip.shape[1], 3), dtype=np.uint8)
+        cv2.putText(header, caption, (6, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.55, color, 1)
+        strip = np.vstack([header, strip])
+
+        ok, buf = cv2.imencode('.jpg', strip, [cv2.IMWRITE_JPEG_QUALITY, 85])
+        if not ok:
+            raise RuntimeError(f'JPEG encoding failed for {name}')
+        data = buf.tobytes()
+
+        if not self.reserve(len(data)):
+            return 0
+        with open(os.path.join(self.output_dir, f'{name}.jpg'), 'wb') as f:
+            f.write(data)
+        return len(data)
+
+    def make_room(self, nbytes):
+        """Delete the oldest strips until nbytes fit in the quota"""
+        if nbytes > self.max_bytes:
+            return False
+        entries = sorted((e for e in os.scandir(self.output_dir) if e.is_file() and e.name.endswith('.jpg')),
+                         key=lambda e: e.stat().st_mtime)
+        for entry in entries:
+            if self.bytes_used + nbytes <= self.max_bytes:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+            except OSError:
+                continue
+            self.bytes_used -= size
+            self.evicted += 1
+        return self.bytes_used + nbytes <= self.max_bytes
+
+    def stats(self):
+        stats = super().stats()
+        stats['evicted'] = self.evicted
+        return stats
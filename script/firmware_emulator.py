@@ -0,0 +1,198 @@
+# RON 88 FIRMWARE EMULATOR
+# Host-side model of ron88_servo_control.ino scheduling, for testing reject timing without a board
+#
+# Example (20 rejects, 300 ms apart, against the current and the old blocking firmware):
+#   python script/firmware_emulator.py --count 20 --interval 300
+#   python script/firmware_emulator.py --count 20 --interval 300 --legacy
+
+import argparse
+from collections import deque
+
+# Must match ron88_servo_control.ino
+DETECTION_DELAY = 5550   # ms
+PUSH_DURATION = 1000     # ms
+COOLDOWN = 100           # ms
+QUEUE_SIZE = 16
+BAUD_RATE = 115200
+
+TX_BUFFER = 64           # Arduino UNO hardware serial TX buffer (bytes)
+
+IDLE, PUSHING, COOLING_DOWN = 'IDLE', 'PUSHING', 'COOLING_DOWN'
+
+
+class FirmwareEmulator:
+    """
+    Event-driven emulation of the servo firmware's loop().
+
+    Times are in milliseconds. Call receive(command, t) in time order, then
+    advance(t_end) to let pending pushes finish. With legacy=True the emulator
+    behaves like the previous firmware: 10-slot queue, 9600 baud verbose
+    messages and a blocking delay(COOLDOWN), during which commands wait unread.
+    """
+
+    def __init__(self, detection_delay=DETECTION_DELAY, push_duration=PUSH_DURATION,
+                 cooldown=COOLDOWN, queue_size=QUEUE_SIZE, baud=BAUD_RATE, legacy=False):
+        if legacy:
+            queue_size, baud = 10, 9600
+        self.detection_delay = detection_delay
+        self.push_duration = push_duration
+        self.cooldown = cooldown
+        self.queue_size = queue_size
+        self.baud = baud
+        self.legacy = legacy
+
+        self.now = 0.0
+        self.busy_until = 0.0     # loop() is blocked (Serial TX full or delay()) until then
+        self.tx_done_at = 0.0     # UART finishes sending everything buffered at this time
+        self.state = IDLE
+        self.state_since = 0.0
+        self.queue = deque()      # (intended push time, command processed time)
+
+        self.good_count = 0
+        self.rejection_count = 0
+        self.dropped_count = 0
+        self.max_pending = 0
+        self.pushes = []          # (intended push time, actual push time)
+        self.output = []          # (time, line)
+
+    # ========== SERIAL ==========
+
+    def _print(self, line):
+        """Log a line and block the loop while it doesn't fit in the TX buffer"""
+        self.output.append((self.now, line))
+        ms_per_byte = 10 * 1000 / self.baud
+        nbytes = len(line) + 2  # println adds \r\n
+        buffered = max(0.0, self.tx_done_at - self.now) / ms_per_byte
+        overflow = buffered + nbytes - TX_BUFFER
+        if overflow > 0:
+            self.now += overflow * ms_per_byte
+            self.busy_until = max(self.busy_until, self.now)
+        self.tx_done_at = max(self.tx_done_at, self.now) + nbytes * ms_per_byte
+
+    # ========== LOOP ==========
+
+    def _next_event(self):
+        if self.state == PUSHING:
+            return self.state_since + self.push_duration
+        if self.state == COOLING_DOWN:
+            return self.state_since + self.cooldown
+        if self.queue:
+            return self.queue[0][1] + self.detection_delay
+        return None
+
+    def _step(self):
+        """Run the state transition that is due at self.now"""
+        if self.state == IDLE:
+            intended, _ = self.queue.popleft()
+            self.state, self.state_since = PUSHING, self.now
+            self.rejection_count += 1
+            self.pushes.append((intended, self.now))
+            if self.legacy:
+                self._print(f"[REJECT] SERVO ACTIVATED (#{self.rejection_count}) - "
+                            f"Pushing bottle ({len(self.queue)} still pending)")
+            else:
+                self._print(f"P{self.rejection_count},{len(self.queue)}")
+        elif self.state == PUSHING:
+            if self.legacy:
+                # delay(COOLDOWN) blocks the whole loop, then the servo is ready
+                self.now += self.cooldown
+                self.busy_until = self.now
+                self.state, self.state_since = IDLE, self.now
+                self._print("[OK] SERVO RETURNED - Ready for next")
+            else:
+                self.state, self.state_since = COOLING_DOWN, self.now
+                self._print("N")
+        else:
+            self.state, self.state_since = IDLE, self.now
+
+    def advance(self, t):
+        """Run loop() until time t (ms)"""
+        while True:
+            event = self._next_event()
+            if event is None:
+                break
+            event = max(event, self.busy_until, self.now)
+            if event > t:
+                break
+            self.now = event
+            self._step()
+        self.now = max(self.now, t)
+
+    def receive(self, command, t):
+        """A command byte arrives at time t; it is read once loop() is free"""
+        self.advance(t)
+        while self.busy_until > self.now:
+            self.advance(self.busy_until)
+        if command == 'R':
+            if len(self.queue) < self.queue_size:
+                # The firmware can only timestamp the command when it reads it
+                self.queue.append((t + self.detection_delay, self.now))
+                self.max_pending = max(self.max_pending, len(self.queue))
+                if self.legacy:
+                    self._print(f"[WARN] DEFECT/WRONG BOTTLE - Rejection queued ({len(self.queue)} pending)")
+                else:
+                    self._print(f"Q{len(self.queue)}")
+            else:
+                self.dropped_count += 1
+                if self.legacy:
+                    self._print("[FULL] Rejection queue full, ignored")
+                else:
+                    self._print(f"F{self.dropped_count}")
+        elif command == 'G':
+            self.good_count += 1
+            if self.legacy:
+                self._print(f"[OK] Good Ron 88 bottle (#{self.good_count})")
+            else:
+                self._print(f"G{self.good_count}")
+        elif command == 'S':
+            self._print(f"S{self.good_count},{self.rejection_count},"
+                        f"{self.dropped_count},{len(self.queue)}")
+
+    def finish(self):
+        """Let every queued rejection run to completion"""
+        self.advance(float('inf'))
+
+    # ========== RESULTS ==========
+
+    def report(self):
+        lateness = [actual - intended for intended, actual in self.pushes]
+        return {
+            'pushes': len(self.pushes),
+            'dropped': self.dropped_count,
+            'max_pending': self.max_pending,
+            'max_late_ms': max(lateness) if lateness else 0.0,
+            'mean_late_ms': sum(lateness) / len(lateness) if lateness else 0.0,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Emulate reject timing under a burst of R commands")
+    parser.add_argument('--count', type=int, default=20, help="Number of R commands")
+    parser.add_argument('--interval', type=float, default=300, help="ms between commands")
+    parser.add_argument('--good-every', type=int, default=0, help="Send a G after every N rejects (0 = none)")
+    parser.add_argument('--queue-size', type=int, default=QUEUE_SIZE)
+    parser.add_argument('--legacy', action='store_true', help="Emulate the old blocking 9600 baud firmware")
+    args = parser.parse_args()
+
+    fw = FirmwareEmulator(queue_size=args.queue_size, legacy=args.legacy)
+    t = 0.0
+    for i in range(args.count):
+        fw.receive('R', t)
+        if args.good_every and (i + 1) % args.good_every == 0:
+            fw.receive('G', t + 1)
+        t += args.interval
+    fw.finish()
+
+    print("="*60)
+    print(f" FIRMWARE EMULATION ({'legacy' if args.legacy else 'non-blocking'})")
+    print("="*60)
+    for intended, actual in fw.pushes:
+        print(f"  push due {intended:8.0f} ms  ->  at {actual:8.0f} ms  (late {actual - intended:6.1f} ms)")
+    result = fw.report()
+    print(f"\nPushes: {result['pushes']}  Dropped: {result['dropped']}  "
+          f"Max pending: {result['max_pending']}")
+    print(f"Lateness: mean {result['mean_late_ms']:.1f} ms, max {result['max_late_ms']:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+# RON 88 LINE SIMULATOR
+# Discrete-event model of the conveyor for throughput capacity planning
+#
+# Synthetic bottles ride the belt past the camera and the servo. A stub detector,
+# timed with recorded inference latencies, feeds the real InspectionPipeline
+# decision logic, and its R/G commands drive the firmware emulator.
+#
+# Examples:
+#   python script/line_simulator.py --rate 20
+#   python script/line_simulator.py --find-max --latency-file latency_imgsz=640.txt
+#   python script/line_simulator.py --find-max --set detection_cooldown=1.0 --set accumulation_frames=3
+
+import argparse
+import contextlib
+import io
+import math
+import random
+import sys
+
+from firmware_emulator import COOLDOWN, DETECTION_DELAY, PUSH_DURATION, QUEUE_SIZE, FirmwareEmulator
+from ron88_defect_production import (CONFIG_PATH, DEFECT_CLASSES, InspectionPipeline,
+                                     load_config, parse_set)
+
+FRAME_WIDTH, FRAME_HEIGHT = 1280, 720
+
+
+def load_latencies(path):
+    """One inference latency in ms per line (as written by benchmark_pipeline.py --save-latencies)"""
+    with open(path) as f:
+        return [float(line) for line in f if line.strip()]
+
+
+def make_bottles(args, rng):
+    """
+    Bottles as dicts: t_center is when the bottle center passes the camera center,
+    kind is 'good', 'defect' or 'wrong_brand'
+    """
+    spacing = 60.0 / args.rate
+    bottles = []
+    t = 10.0  # Leave the pipeline's detection cooldown time to expire before the first bottle
+    for i in range(args.bottles):
+        r = rng.random()
+        if r < args.wrong_brand_rate:
+            kind, defect = 'wrong_brand', None
+        elif r < args.wrong_brand_rate + args.defect_rate:
+            kind, defect = 'defect', rng.choice(DEFECT_CLASSES)
+        else:
+            kind, defect = 'good', None
+        bottles.append({'index': i, 't_center': t, 'kind': kind, 'defect': defect, 'decisions': []})
+        t += spacing * (1 + rng.uniform(-args.spacing_jitter, args.spacing_jitter))
+    return bottles
+
+
+def stub_detect(bottles, t, args, rng):
+    """Detections the model would return for the bottles under the camera at time t"""
+    detections = []
+    half_w = args.bottle_width_cm * args.px_per_cm / 2
+    for bottle in bottles:
+        x_cm = (t - bottle['t_center']) * args.speed
+        x = FRAME_WIDTH / 2 + x_cm * args.px_per_cm
+        if x + half_w < 0 or x - half_w > FRAME_WIDTH:
+            continue
+        box = (int(x - half_w), 80, int(x + half_w), 620)
+        if rng.random() < args.detect_prob:
+            class_id = 1 if bottle['kind'] == 'wrong_brand' else 0
+            detections.append((class_id, rng.uniform(0.75, 0.95), box))
+        if bottle['defect'] is not None and rng.random() < args.defect_recall:
+            detections.append((bottle['defect'], rng.uniform(0.65, 0.90), box))
+    return detections
+
+
+def simulate(config, args, latencies, seed=0):
+    rng = random.Random(seed)
+    bottles = make_bottles(args, rng)
+    pipeline = InspectionPipeline(config)
+    pipeline.set_frame_size(FRAME_WIDTH, FRAME_HEIGHT)
+    fw = FirmwareEmulator(detection_delay=args.detection_delay, push_duration=args.push_duration,
+                          cooldown=args.cooldown, queue_size=args.queue_size)
+
+    frame_period = 1.0 / args.fps
+    end_time = bottles[-1]['t_center'] + 5.0
+    t = 0.0
+    # The pipeline prints one line per bottle; keep the simulator output readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        while t < end_time:
+            # Only bottles near the camera matter; this keeps long runs fast
+            nearby = [b for b in bottles if abs(t - b['t_center']) * args.speed < 60]
+            detections = stub_detect(nearby, t, args, rng)
+            t_done = t + rng.choice(latencies) / 1000
+            decision, _ = pipeline.process(detections, t_done)
+
+            if decision:
+                # Attribute the decision to the bottle closest to the camera center
+                bottle = min(nearby or bottles, key=lambda b: abs(t - b['t_center']))
+                bottle['decisions'].append(decision['result'])
+                command = 'R' if decision['result'] == 'REJECT' else 'G'
+                fw.receive(command, t_done * 1000 + args.serial_latency)
+
+            # cap.read() returns the next frame the camera delivers after inference
+            t = math.ceil(t_done / frame_period) * frame_period
+            if t <= t_done:
+                t += frame_period
+        fw.finish()
+
+    # A bottle is diverted if it reaches the servo while the arm is out
+    servo_cm = args.servo_distance if args.servo_distance is not None \
+        else args.speed * args.detection_delay / 1000
+    window = args.push_window_cm / args.speed
+    pushed = set()
+    for _, push_at in fw.pushes:
+        start, end = push_at / 1000, (push_at + args.push_duration) / 1000
+        for bottle in bottles:
+            at_servo = bottle['t_center'] + servo_cm / args.speed
+            if at_servo + window >= start and at_servo - window <= end:
+                pushed.add(bottle['index'])
+
+    should_reject = {b['index'] for b in bottles if b['kind'] != 'good'}
+    fw_report = fw.report()
+    return {
+        'bottles': len(bottles),
+        'undecided': sum(1 for b in bottles if not b['decisions']),
+        'double_decided': sum(1 for b in bottles if len(b['decisions']) > 1),
+        'should_reject': len(should_reject),
+        'missed_rejections': len(should_reject - pushed),
+        'false_rejections': len(pushed - should_reject),
+        'queue_overflows': fw_report['dropped'],
+        'max_pending': fw_report['max_pending'],
+        'max_late_ms': fw_report['max_late_ms'],
+    }
+
+
+def sustainable(result):
+    return (result['undecided'] == 0 and result['double_decided'] == 0 and
+            result['missed_rejections'] == 0 and result['false_rejections'] == 0 and
+            result['queue_overflows'] == 0)
+
+
+def print_result(rate, result):
+    print(f"{rate:6.1f}/min  undecided {result['undecided']:4d}  double {result['double_decided']:4d}  "
+          f"missed {result['missed_rejections']:4d}/{result['should_reject']:<4d} "
+          f"false {result['false_rejections']:4d}  overflow {result['queue_overflows']:4d}  "
+          f"max queue {result['max_pending']:3d}  "
+          f"{'OK' if sustainable(result) else '--'}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate line throughput against the real decision logic")
+    parser.add_argument('--config', default=CONFIG_PATH, help="Production JSON config")
+    parser.add_argument('--set', action='append', default=[], metavar='KEY=VALUE',
+                        help="Override a production config key")
+
+    line = parser.add_argument_group('line')
+    line.add_argument('--rate', type=float, default=20, help="Bottles per minute")
+    line.add_argument('--bottles', type=int, default=200, help="Bottles per run")
+    line.add_argument('--speed', type=float, default=10, help="Belt speed (cm/s)")
+    line.add_argument('--spacing-jitter', type=float, default=0.1, help="Random spacing variation (fraction)")
+    line.add_argument('--defect-rate', type=float, default=0.2)
+    line.add_argument('--wrong-brand-rate', type=float, default=0.05)
+    line.add_argument('--bottle-width-cm', type=float, default=7)
+    line.add_argument('--px-per-cm', type=float, default=20, help="Image scale at the belt")
+
+    vision = parser.add_argument_group('camera / detector')
+    vision.add_argument('--fps', type=float, default=30)
+    vision.add_argument('--latency-ms', type=float, default=80, help="Fixed inference latency")
+    vision.add_argument('--latency-file', help="Recorded latencies to sample from (ms, one per line)")
+    vision.add_argument('--detect-prob', type=float, default=1.0, help="Per-frame bottle recall")
+    vision.add_argument('--defect-recall', type=float, default=1.0, help="Per-frame defect recall")
+    vision.add_argument('--serial-latency', type=float, default=2, help="ms from write() to the firmware")
+
+    servo = parser.add_argument_group('servo / firmware')
+    servo.add_argument('--detection-delay', type=float, default=DETECTION_DELAY)
+    servo.add_argument('--push-duration', type=float, default=PUSH_DURATION)
+    servo.add_argument('--cooldown', type=float, default=COOLDOWN)
+    servo.add_argument('--queue-size', type=int, default=QUEUE_SIZE)
+    servo.add_argument('--servo-distance', type=float,
+                       help="cm from camera center to servo (default: speed x detection delay)")
+    servo.add_argument('--push-window-cm', type=float, default=2,
+                       help="How far from the arm a bottle center can be and still be diverted")
+
+    parser.add_argument('--find-max', action='store_true', help="Sweep the rate to find the maximum sustainable")
+    parser.add_argument('--max-rate', type=float, default=120)
+    parser.add_argument('--step', type=float, default=2)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    try:
+        config = load_config(args.config, parse_set(args.set))
+    except ValueError as e:
+        print(f"[ERROR] ERROR: {e}")
+        sys.exit(1)
+    latencies = load_latencies(args.latency_file) if args.latency_file else [args.latency_ms]
+
+    print("="*70)
+    print(" RON 88 LINE SIMULATION")
+    print("="*70)
+    print(f"Belt {args.speed} cm/s | cooldown {config['detection_cooldown']}s | "
+          f"accumulation {config['accumulation_frames']} frames | "
+          f"latency {sum(latencies) / len(latencies):.0f} ms avg | queue {args.queue_size}\n")
+
+    if not args.find_max:
+        print_result(args.rate, simulate(config, args, latencies, args.seed))
+        return
+
+    best = None
+    rate = args.step
+    while rate <= args.max_rate:
+        args.rate = rate
+        result = simulate(config, args, latencies, args.seed)
+        print_result(rate, result)
+        if not sustainable(result):
+            break
+        best = rate
+        rate += args.step
+
+    print("\n" + "="*70)
+    if best is None:
+        print(" No sustainable rate found in the swept range")
+    else:
+        print(f" Max sustainable: {best:.0f} bottles/min "
+              f"(min spacing {args.speed * 60 / best:.1f} cm at {args.speed} cm/s)")
+    print("="*70)
+
+
+if __name__ == '__main__':
+    main()
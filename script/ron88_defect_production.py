@@ -1,21 +1,111 @@
 # RON 88 DEFECT-LEVEL QUALITY INSPECTION
 
-import cv2
-from ultralytics import YOLO
-import serial
 import time
-import sys
+process_start = time.time()
+
+# ultralytics/torch and pyserial are imported lazily in the start-up threads
+import cv2
+import numpy as np
+import argparse
+import collections
 import csv
+import json
 import os
+import random
+import socket
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta
 
+from camera_profile import PROFILE_PATH, load_profile, open_camera, frame_size
+from collector_client import CollectorClient
+from evidence_recorder import EvidenceRecorder
+from sample_recorder import SampleRecorder
+
+CV2_IMPORT_TIME = time.time() - process_start
+
 # ========== CONFIGURATION ==========
-MODEL_PATH = 'C:\\Users\\jihad\\D\\! All\\! Project\\23. Conveyor Belt\\model\\best.pt'
-ARDUINO_PORT = 'COM7'  # Change to your port
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BASE_DIR)
+CONFIG_PATH = os.path.join(ROOT_DIR, 'config', 'production.json')
+
+# Defaults, overridden by the config file and then by command-line options
+DEFAULT_CONFIG = {
+    'model_path': os.path.join(ROOT_DIR, 'model', 'best.pt'),
+    'arduino_port': 'COM7',          # Change to your port; null = TEST MODE without trying
+    'arduino_baud': 115200,          # Must match BAUD_RATE in ron88_servo_control.ino
+    'arduino_boot_timeout': 3.0,     # Max seconds to wait for the firmware banner after the UNO resets
+
+    # Video input: camera from the camera profile, or a video file for benchmarks
+    'camera_profile': PROFILE_PATH,
+    'camera_index': None,            # Overrides the index stored in the camera profile
+    'source': None,                  # Path to a video file instead of the camera
+
+    # Inference
+    'imgsz': 640,                    # Model input size
+    'device': None,                  # e.g. 'cpu' or '0'; None = ultralytics default
+    'threads': None,                 # torch CPU threads; None = torch default
+    'warmup_runs': 3,                # Dummy inferences at the camera frame size before the line starts
+    'predict_confidence': 0.30,      # Low conf, filter later
+
+    # Two-stage cascade: a cheap low-resolution pass localizes bottles on every frame,
+    # and the defect pass runs on the bottle crop only when a Ron 88 is centered
+    'cascade': False,
+    'localizer_model_path': None,    # e.g. a YOLOv8n bottle/brand model; None = model_path
+    'localizer_imgsz': 320,
+    'defect_imgsz': 640,             # Applied to the crop, so defects get far more pixels
+    'crop_padding': 0.15,            # Fraction of the bottle box added on each side of the crop
+    'center_tolerance': 120,         # Max px between bottle center and frame center line
+
+    # Detection thresholds
+    'bottle_confidence': 0.70,       # NOTE: For bottle detection (class 0, 1)
+    'defect_confidence': 0.60,       # NOTE: For defect detection (class 2-6)
+
+    # Detection zone
+    'zone_width': 400,
+    'zone_height': 650,
+    'zone_margin': 0,                # Extra pixels around the zone where detection centers still count
+
+    # Timing
+    'detection_cooldown': 2.5,       # Seconds between bottle detections
+    'accumulation_frames': 5,        # Number of frames to accumulate defects before deciding
+
+    # Sample recorder: save borderline / disagreeing frames for the next training set
+    'record_samples': False,
+    'record_dir': os.path.join(ROOT_DIR, 'dataset', 'review'),
+    'record_margin': 0.10,           # Confidence within +/- this of a threshold counts as borderline
+    'record_min_interval': 1.0,      # Seconds between saved samples of the same reason
+    'record_queue_size': 16,         # Pending samples before new ones are dropped
+    'record_max_mb': 2000,           # Disk quota for record_dir
+
+    # Evidence strips: zone crops around each REJECT (and a sample of PASSes) for QA review
+    'record_evidence': True,
+    'evidence_dir': os.path.join(ROOT_DIR, 'inference_result', 'evidence'),
+    'evidence_frames': 8,            # Pre-roll: recent zone crops kept in memory
+    'evidence_post_frames': 2,       # Frames after the decision added to the strip
+    'evidence_pass_rate': 0.0,       # Share of PASS bottles that also get a strip (0-1)
+    'evidence_height': 240,          # Tile height in the strip (px)
+    'evidence_queue_size': 8,        # Pending strips before new ones are dropped
+    'evidence_max_mb': 1000,         # Disk quota for evidence_dir; oldest strips are deleted first
+
+    # Central collector (script/collector.py): per-bottle records are batched, compressed
+    # and pushed in the background, and spooled to disk while the collector is unreachable
+    'collector_url': None,           # e.g. "http://127.0.0.1:8765"; None = local reports only
+    'station_id': None,              # Name of this line in the collector; None = host name
+    'collector_spool_dir': os.path.join(ROOT_DIR, 'inference_result', 'spool'),
+    'collector_batch_size': 50,      # Records per upload
+    'collector_flush_interval': 2.0, # Max seconds a record waits before its batch is sent
+    'collector_retry_interval': 10.0,  # Seconds between delivery attempts while the collector is down
+    'collector_max_spool_mb': 500,   # Disk quota for the spool; oldest batches are deleted first
+
+    # Output
+    'report_dir': os.path.join(ROOT_DIR, 'inference_result'),
+    'headless': False,               # No preview window (benchmarks, remote runs)
+    'max_frames': None,              # Stop after this many frames
+}
 
-# Detection thresholds
-BOTTLE_CONFIDENCE = 0.70      # NOTE: For bottle detection (class 0, 1)
-DEFECT_CONFIDENCE = 0.60      # NOTE: For defect detection (class 2-6)
+PATH_KEYS = ['model_path', 'localizer_model_path', 'camera_profile', 'record_dir', 'evidence_dir',
+             'collector_spool_dir', 'report_dir']
 
 # Class definitions (must match training)
 CLASS_NAMES = {
@@ -31,139 +121,430 @@ CLASS_NAMES = {
 BOTTLE_CLASSES = [0, 1]  # Bottle detection classes
 DEFECT_CLASSES = [2, 3, 4, 5, 6]  # Defect detection classes
 
-# Detection zone
-ZONE_WIDTH = 400
-ZONE_HEIGHT = 650
-
-# Timing
-DETECTION_COOLDOWN = 2.5  # Seconds between bottle detections
-ACCUMULATION_FRAMES = 5   # Number of frames to accumulate defects before deciding
-
-# ========== CAMERA SETUP ==========
-print("="*70)
-print(" RON 88 PRODUCTION-GRADE INSPECTION SYSTEM")
-print("="*70)
-print("\n Initializing camera...")
-
-cap = cv2.VideoCapture(1, cv2.CAP_DSHOW)
-cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
-cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
-cap.set(cv2.CAP_PROP_FPS, 30)
-
-if not cap.isOpened():
-    print("[ERROR] ERROR: Cannot open camera!")
-    sys.exit(1)
-
-ret, frame = cap.read()
-if not ret:
-    print("[ERROR] ERROR: Cannot read from camera!")
-    sys.exit(1)
-
-FRAME_HEIGHT, FRAME_WIDTH = frame.shape[:2]
-CENTER_X, CENTER_Y = FRAME_WIDTH // 2, FRAME_HEIGHT // 2
-
-ZONE_X1 = CENTER_X - ZONE_WIDTH // 2
-ZONE_X2 = CENTER_X + ZONE_WIDTH // 2
-ZONE_Y1 = 0
-ZONE_Y2 = ZONE_HEIGHT
-
-print(f"[OK] Camera: {FRAME_WIDTH}x{FRAME_HEIGHT} @ {cap.get(cv2.CAP_PROP_FPS)} FPS")
-
-# ========== MODEL SETUP ==========
-print(f"\n Loading defect-level detection model...")
-
-try:
-    model = YOLO(MODEL_PATH)
-    print("[OK] Model loaded!")
-    print(f"   Classes: {list(CLASS_NAMES.values())}")
-except Exception as e:
-    print(f"[ERROR] ERROR: {e}")
-    sys.exit(1)
-
-# ========== ARDUINO SETUP ==========
-print(f"\n Connecting to Arduino on {ARDUINO_PORT}...")
-
-arduino = None
-try:
-    arduino = serial.Serial(ARDUINO_PORT, 9600, timeout=1)
-    time.sleep(2)
-    print("[OK] Arduino connected!")
-    time.sleep(0.5)
-    while arduino.in_waiting:
-        print(f"   {arduino.readline().decode().strip()}")
-except Exception as e:
-    print(f"[WARN] WARNING: {e}")
-    print("   Running in TEST MODE")
-    arduino = None
-
-# ========== STATISTICS ==========
-total_bottles = 0
-good_ron88 = 0
-rejected_bottles = 0
-wrong_brand_count = 0
-last_detection_time = 0
-session_start_time = time.time()
-
-# Defect counters
-defect_stats = {
-    'low_fill': 0,
-    'no_cap': 0,
-    'loose_cap': 0,
-    'debris': 0,
-    'label_damage': 0
+# Defect class -> (defect_stats key, report label)
+DEFECT_LABELS = {
+    2: ('low_fill', 'LOW_FILL'),
+    3: ('no_cap', 'NO_CAP'),
+    4: ('loose_cap', 'LOOSE_CAP'),
+    5: ('debris', 'DEBRIS'),
+    6: ('label_damage', 'LABEL_DMG'),
 }
 
-# Multi-defect tracking
-multi_defect_bottles = 0
 
-# Per-bottle log: each entry is a dict with bottle_id, timestamp, result, bottle_type, defects
-bottle_log = []
+def load_config(path=CONFIG_PATH, overrides=None):
+    """
+    Defaults, updated from the JSON config file and then from overrides.
+    Only the default config/production.json may be missing.
+    """
+    config = dict(DEFAULT_CONFIG)
+    if path and os.path.exists(path):
+        with open(path) as f:
+            config.update(json.load(f))
+    elif path and os.path.abspath(path) != os.path.abspath(CONFIG_PATH):
+        raise ValueError(f"Config file not found: {path}")
+    config.update(overrides or {})
+    unknown = set(config) - set(DEFAULT_CONFIG)
+    if unknown:
+        raise ValueError(f"Unknown config keys: {', '.join(sorted(unknown))}")
+    # Relative paths are relative to the repository root
+    for key in PATH_KEYS:
+        if config[key] and not os.path.isabs(config[key]):
+            config[key] = os.path.join(ROOT_DIR, config[key])
+    return config
+
 
 def generate_bottle_id():
     """Generate bottle ID based on current timestamp (WIB, down to second)"""
     now = datetime.now(timezone(timedelta(hours=7)))
     return now.strftime("BTL-%Y%m%d-%H%M%S")
 
-# Accumulation state: collect defects across multiple frames before deciding
-accumulating = False
-accum_frame_count = 0
-accum_bottle_type = None
-accum_defects = set()
 
-# Persistent decision display
-last_decision_text = ""
-last_decision_color = (255, 255, 255)
-
-# ========== HELPER FUNCTIONS ==========
-
-def is_in_zone(box_center_x, box_center_y):
-    """Check if detection is in the detection zone"""
-    return (ZONE_X1 <= box_center_x <= ZONE_X2 and
-            ZONE_Y1 <= box_center_y <= ZONE_Y2)
+def detections_from_results(results):
+    """Flatten ultralytics results into (class_id, confidence, (x1, y1, x2, y2)) tuples"""
+    detections = []
+    for result in results:
+        for box in result.boxes:
+            detections.append((int(box.cls[0]), float(box.conf[0]),
+                               tuple(map(int, box.xyxy[0]))))
+    return detections
 
-def get_box_center(box):
-    """Get center coordinates of bounding box"""
-    x1, y1, x2, y2 = map(int, box.xyxy[0])
-    return (x1 + x2) // 2, (y1 + y2) // 2
 
-def analyze_detections(results):
+class InspectionPipeline:
     """
-    Analyze all detections in frame
-    Returns: bottle_type, defects_list, all_boxes_data
+    Camera -> YOLO -> multi-frame decision -> Arduino, plus reporting.
+
+    The constructor only sets up state; start() opens the camera, model and
+    serial port. process() holds the decision logic and can be driven directly
+    with detections (no hardware needed).
     """
-    bottle_type = None
-    defects = []
-    all_boxes = []
 
-    for result in results:
-        for box in result.boxes:
-            class_id = int(box.cls[0])
-            confidence = float(box.conf[0])
-            x1, y1, x2, y2 = map(int, box.xyxy[0])
-            center_x, center_y = get_box_center(box)
+    def __init__(self, config):
+        self.config = config
+        self.cap = None
+        self.model = None
+        self.localizer = None
+        self.arduino = None
+        self.recorder = None
+        self.evidence = None
+        self.collector = None
+        self.session_id = datetime.now(timezone(timedelta(hours=7))).strftime("%Y%m%d_%H%M%S")
+        self.record_seq = 0               # Per-session record number for the collector (survives resets)
+        self.evidence_ring = collections.deque(maxlen=config['evidence_frames'])
+        self.evidence_pending = []        # [name, caption, result, frames, decision_index, frames_left]
+        self.startup_timings = {}
+        self.first_decision_time = None
+        self.start_time = time.time()
+        self.session_start_time = time.time()
+        self.last_detection_time = 0
+
+        # Frame statistics (inference latency of recent frames, for benchmarks)
+        self.frames = 0
+        self.defect_passes = 0
+        self.defect_pass_skipped = False  # Cascade: Ron 88 in the zone but no defect pass this frame
+        self.inference_times = collections.deque(maxlen=1000)
+
+        self.set_frame_size(1280, 720)
+        self.reset_stats()
+
+    # ========== START-UP ==========
+
+    def start(self):
+        """
+        Bring up camera, model and Arduino. Model loading and the Arduino
+        connection run in background threads while the camera is opened on
+        the calling thread.
+        """
+        self.start_time = time.time()
+        self.startup_timings = {'import_cv2': CV2_IMPORT_TIME}
+        config = self.config
+
+        print("="*70)
+        print(" RON 88 PRODUCTION-GRADE INSPECTION SYSTEM")
+        print("="*70)
+
+        profile = load_profile(config['camera_profile'])
+        if config['camera_index'] is not None:
+            profile['camera_index'] = config['camera_index']
+
+        startup_pool = ThreadPoolExecutor(max_workers=2)
+        model_future = startup_pool.submit(self.load_model, profile['width'], profile['height'])
+        arduino_future = startup_pool.submit(self._connect_arduino) if config['arduino_port'] else None
+
+        # ========== CAMERA SETUP ==========
+        print("\n Initializing camera...")
+
+        t0 = time.time()
+        if config['source']:
+            self.cap = cv2.VideoCapture(config['source'])
+        else:
+            self.cap = open_camera(profile)
+
+        if not self.cap.isOpened():
+            self._abort_startup(startup_pool, arduino_future)
+            raise RuntimeError("Cannot open camera!")
+
+        self.set_frame_size(*frame_size(self.cap))
+        self.startup_timings['camera_open'] = time.time() - t0
+        print(f"[OK] Camera: {self.frame_width}x{self.frame_height} @ {self.cap.get(cv2.CAP_PROP_FPS)} FPS")
+
+        # ========== MODEL SETUP ==========
+        print(f"\n Loading defect-level detection model...")
+
+        try:
+            warmup_latencies = model_future.result()
+        except BaseException:
+            self._abort_startup(startup_pool, arduino_future)
+            raise
+        print("[OK] Model loaded!")
+        print(f"   Classes: {list(CLASS_NAMES.values())}")
+        if config['cascade']:
+            print(f"   Cascade: localizer @ {config['localizer_imgsz']}, defects on bottle crop @ {config['defect_imgsz']}")
+        if warmup_latencies:
+            print(f"   Warm-up: {' -> '.join(f'{t * 1000:.0f}ms' for t in warmup_latencies)}")
+
+        # ========== ARDUINO SETUP ==========
+        print(f"\n Connecting to Arduino on {config['arduino_port']}...")
+
+        try:
+            if arduino_future is None:
+                raise RuntimeError("No Arduino port configured")
+            self.arduino, banner = arduino_future.result()
+            print("[OK] Arduino connected!")
+            for line in banner:
+                print(f"   {line}")
+        except Exception as e:
+            print(f"[WARN] WARNING: {e}")
+            print("   Running in TEST MODE")
+            self.arduino = None
+
+        startup_pool.shutdown(wait=False)
+        self.startup_timings['total'] = time.time() - self.start_time + CV2_IMPORT_TIME
+
+        # Steps inside the two start-up threads overlap with the camera open, so the
+        # individual times add up to more than the total
+        print("\n START-UP REPORT")
+        for step, seconds in self.startup_timings.items():
+            print(f"   {step:20s} {seconds:6.2f}s")
+
+        # ========== SAMPLE RECORDER SETUP ==========
+        if config['record_samples']:
+            self.recorder = SampleRecorder(config['record_dir'],
+                                           min_interval=config['record_min_interval'],
+                                           queue_size=config['record_queue_size'],
+                                           max_bytes=config['record_max_mb'] * 1024 * 1024).start()
+            print(f"\n[OK] Recording borderline samples to {os.path.abspath(config['record_dir'])}")
+
+        # ========== EVIDENCE RECORDER SETUP ==========
+        if config['record_evidence']:
+            self.evidence = EvidenceRecorder(config['evidence_dir'],
+                                             height=config['evidence_height'],
+                                             queue_size=config['evidence_queue_size'],
+                                             max_bytes=config['evidence_max_mb'] * 1024 * 1024).start()
+            print(f"[OK] Saving evidence strips to {os.path.abspath(config['evidence_dir'])}")
+
+        # ========== COLLECTOR CLIENT SETUP ==========
+        if config['collector_url']:
+            station = config['station_id'] or socket.gethostname()
+            self.collector = CollectorClient(config['collector_url'], station, config['collector_spool_dir'],
+                                             batch_size=config['collector_batch_size'],
+                                             flush_interval=config['collector_flush_interval'],
+                                             retry_interval=config['collector_retry_interval'],
+                                             max_bytes=config['collector_max_spool_mb'] * 1024 * 1024).start()
+            print(f"[OK] Pushing records to {config['collector_url']} as station '{station}'")
+
+        self.session_start_time = time.time()
+
+    def _abort_startup(self, startup_pool, arduino_future):
+        """Wait for the start-up threads, then release whatever they or the camera opened"""
+        print("[WARN] Start-up failed, releasing resources...")
+        # A model load that is already running can't be cancelled; wait for it so
+        # the serial port the other thread may have opened can be closed before exit
+        startup_pool.shutdown(wait=True, cancel_futures=True)
+        if arduino_future is not None and not arduino_future.cancelled() and arduino_future.exception() is None:
+            arduino_future.result()[0].close()
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+    def load_model(self, width, height):
+        """
+        Import the detector stack, load the model(s) and warm them up at the
+        production frame size. Returns the warm-up latencies.
+        """
+        config = self.config
+
+        t0 = time.time()
+        import torch
+        if config['threads']:
+            torch.set_num_threads(config['threads'])
+        self.startup_timings['import_torch'] = time.time() - t0
+
+        t0 = time.time()
+        from ultralytics import YOLO
+        self.startup_timings['import_ultralytics'] = time.time() - t0
+
+        t0 = time.time()
+        self.model = YOLO(config['model_path'])
+        self.localizer = self.model
+        if config['cascade'] and config['localizer_model_path']:
+            self.localizer = YOLO(config['localizer_model_path'])
+        self.startup_timings['model_load'] = time.time() - t0
+
+        # The first predict calls pay for lazy initialisation (graph setup, memory
+        # allocation, fusing); run them here instead of on the first bottles
+        t0 = time.time()
+        dummy = np.full((height, width, 3), 114, dtype=np.uint8)
+        dummy_crop = np.full((config['zone_height'], config['zone_width'] // 2, 3), 114, dtype=np.uint8)
+        warmup_latencies = []
+        for _ in range(config['warmup_runs']):
+            t1 = time.time()
+            if config['cascade']:
+                self._predict(self.localizer, dummy, config['localizer_imgsz'], BOTTLE_CLASSES)
+                self._predict(self.model, dummy_crop, config['defect_imgsz'], DEFECT_CLASSES)
+            else:
+                self._predict(self.model, dummy)
+            warmup_latencies.append(time.time() - t1)
+        self.startup_timings['model_warmup'] = time.time() - t0
+        return warmup_latencies
+
+    def _connect_arduino(self):
+        """Open the serial port and wait for the firmware banner instead of a fixed sleep"""
+        config = self.config
+
+        t0 = time.time()
+        import serial
+        self.startup_timings['import_serial'] = time.time() - t0
+
+        t0 = time.time()
+        arduino = serial.Serial(config['arduino_port'], config['arduino_baud'], timeout=0.1)
+        # The UNO resets when the port opens; the RDY banner marks the end of setup()
+        banner = []
+        deadline = time.time() + config['arduino_boot_timeout']
+        ready = False
+        while time.time() < deadline:
+            line = arduino.readline().decode(errors='ignore').strip()
+            if line:
+                banner.append(line)
+                if line.startswith('RDY'):
+                    ready = True
+                    break
+        if not ready:
+            # Old firmware or a baud mismatch: commands would arrive as garbage and nothing
+            # would be rejected, so fall back to TEST MODE instead of reporting a connection
+            arduino.close()
+            received = f"; received {banner[-3:]}" if banner else ""
+            raise RuntimeError(f"No RDY banner from {config['arduino_port']} within "
+                               f"{config['arduino_boot_timeout']}s at {config['arduino_baud']} baud "
+                               f"(flash ron88_servo_control.ino and check arduino_baud){received}")
+        arduino.timeout = 1
+        self.startup_timings['serial_connect'] = time.time() - t0
+        return arduino, banner
+
+    def set_frame_size(self, width, height):
+        """Store the frame size and derive the inspection zone from it"""
+        config = self.config
+        self.frame_width, self.frame_height = width, height
+        self.center_x, self.center_y = width // 2, height // 2
+
+        self.zone_x1 = self.center_x - config['zone_width'] // 2
+        self.zone_x2 = self.center_x + config['zone_width'] // 2
+        self.zone_y1 = 0
+        self.zone_y2 = config['zone_height']
+
+    # ========== STATISTICS ==========
+
+    def reset_stats(self):
+        self.total_bottles = 0
+        self.good_ron88 = 0
+        self.rejected_bottles = 0
+        self.wrong_brand_count = 0
+
+        # Defect counters
+        self.defect_stats = {key: 0 for key, _ in DEFECT_LABELS.values()}
+
+        # Multi-defect tracking
+        self.multi_defect_bottles = 0
+
+        # Per-bottle log: each entry is a dict with bottle_id, timestamp, result, bottle_type, defects, evidence
+        self.bottle_log = []
+
+        # Accumulation state: collect defects across multiple frames before deciding
+        self.accumulating = False
+        self.accum_frame_count = 0
+        self.accum_bottle_type = None
+        self.accum_defects = set()
+        self.accum_bottle_types = set()   # Bottle classes seen per frame (for disagreement check)
+        self.accum_defect_frames = {}     # Defect class -> number of frames it was seen in
+
+        # Persistent decision display
+        self.last_decision_text = ""
+        self.last_decision_color = (255, 255, 255)
+
+    def print_stats(self):
+        print("\n" + "="*70)
+        print(" PRODUCTION STATISTICS")
+        print("="*70)
+        print(f"Total inspected:     {self.total_bottles}")
+        print(f"Good Ron 88:         {self.good_ron88}")
+        print(f"Rejected:            {self.rejected_bottles}")
+        if self.total_bottles > 0:
+            print(f"Quality rate:        {(self.good_ron88/self.total_bottles)*100:.1f}%")
+            print(f"Rejection rate:      {(self.rejected_bottles/self.total_bottles)*100:.1f}%")
+        print("\nRejection breakdown:")
+        print(f"  Wrong brand:       {self.wrong_brand_count}")
+        print(f"  Low fill:          {self.defect_stats['low_fill']}")
+        print(f"  No cap:            {self.defect_stats['no_cap']}")
+        print(f"  Loose cap:         {self.defect_stats['loose_cap']}")
+        print(f"  Debris:            {self.defect_stats['debris']}")
+        print(f"  Label damage:      {self.defect_stats['label_damage']}")
+        print(f"  Multi-defect:      {self.multi_defect_bottles}")
+        print("="*70 + "\n")
+
+    # ========== DETECTION ==========
+
+    def _predict(self, model, frame, imgsz=None, classes=None):
+        config = self.config
+        return model.predict(frame, conf=config['predict_confidence'], imgsz=imgsz or config['imgsz'],
+                             classes=classes, device=config['device'], verbose=False)
+
+    def detect(self, frame):
+        """Run the model on a frame and return flat detections"""
+        t0 = time.time()
+        if self.config['cascade']:
+            detections = self.detect_cascade(frame)
+        else:
+            detections = detections_from_results(self._predict(self.model, frame))
+        self.inference_times.append(time.time() - t0)
+        return detections
+
+    def detect_cascade(self, frame):
+        """
+        Stage 1: localize bottles and brand at localizer_imgsz on every frame.
+        Stage 2: when a Ron 88 is centered, run the defect pass on its crop at
+        defect_imgsz and map the boxes back to frame coordinates.
+
+        Ron 88 boxes are only reported while centered (when stage 2 ran).
+        When a Ron 88 is in the zone but not centered, defect_pass_skipped is
+        set and run() keeps that frame out of accumulation, so every Ron 88
+        frame that counts toward a decision had a defect pass. Other-brand
+        boxes are always reported; they are rejected regardless.
+        """
+        config = self.config
+        bottles = detections_from_results(
+            self._predict(self.localizer, frame, config['localizer_imgsz'], BOTTLE_CLASSES))
+
+        target = None
+        ron88_in_zone = False
+        for class_id, confidence, (x1, y1, x2, y2) in bottles:
+            center_x, center_y = (x1 + x2) // 2, (y1 + y2) // 2
+            if (class_id == 0 and confidence >= config['bottle_confidence'] and
+                    self.is_in_zone(center_x, center_y)):
+                ron88_in_zone = True
+                if (abs(center_x - self.center_x) <= config['center_tolerance'] and
+                        (target is None or confidence > target[1])):
+                    target = (class_id, confidence, (x1, y1, x2, y2))
+
+        self.defect_pass_skipped = target is None and ron88_in_zone
+        detections = [d for d in bottles if d[0] != 0]
+        if target is None:
+            return detections
+
+        # Padded bottle crop, clipped to the frame
+        x1, y1, x2, y2 = target[2]
+        pad_x, pad_y = int((x2 - x1) * config['crop_padding']), int((y2 - y1) * config['crop_padding'])
+        cx1, cy1 = max(0, x1 - pad_x), max(0, y1 - pad_y)
+        cx2, cy2 = min(self.frame_width, x2 + pad_x), min(self.frame_height, y2 + pad_y)
+
+        self.defect_passes += 1
+        defects = detections_from_results(
+            self._predict(self.model, frame[cy1:cy2, cx1:cx2], config['defect_imgsz'], DEFECT_CLASSES))
+
+        detections.extend(d for d in bottles if d[0] == 0)
+        for class_id, confidence, (dx1, dy1, dx2, dy2) in defects:
+            detections.append((class_id, confidence, (dx1 + cx1, dy1 + cy1, dx2 + cx1, dy2 + cy1)))
+        return detections
+
+    def is_in_zone(self, box_center_x, box_center_y):
+        """Check if detection is in the detection zone"""
+        margin = self.config['zone_margin']
+        return (self.zone_x1 - margin <= box_center_x <= self.zone_x2 + margin and
+                self.zone_y1 - margin <= box_center_y <= self.zone_y2 + margin)
+
+    def analyze_detections(self, detections):
+        """
+        Analyze all detections in frame
+        Returns: bottle_type, defects_list, all_boxes_data
+        """
+        config = self.config
+        bottle_type = None
+        defects = []
+        all_boxes = []
+
+        for class_id, confidence, (x1, y1, x2, y2) in detections:
+            center_x, center_y = (x1 + x2) // 2, (y1 + y2) // 2
 
             # Check if in detection zone
-            if not is_in_zone(center_x, center_y):
+            if not self.is_in_zone(center_x, center_y):
                 continue
 
             # Store box data
@@ -178,211 +559,257 @@ def analyze_detections(results):
 
             # Categorize detection
             if class_id in BOTTLE_CLASSES:
-                if confidence >= BOTTLE_CONFIDENCE:
+                if confidence >= config['bottle_confidence']:
                     bottle_type = class_id
             elif class_id in DEFECT_CLASSES:
-                if confidence >= DEFECT_CONFIDENCE:
+                if confidence >= config['defect_confidence']:
                     defects.append(class_id)
 
-    return bottle_type, defects, all_boxes
-
-def draw_detections(frame, boxes_data):
-    """Draw all bounding boxes with appropriate colors"""
-    for box_data in boxes_data:
-        class_id = box_data['class_id']
-        class_name = box_data['class_name']
-        confidence = box_data['confidence']
-        x1, y1, x2, y2 = box_data['bbox']
-
-        # Color coding
-        if class_id == 0:  # Ron 88 bottle
-            color = (0, 255, 0)  # Green
-            thickness = 3
-        elif class_id == 1:  # Other brand
-            color = (0, 0, 255)  # Red
-            thickness = 3
-        else:  # Defects
-            color = (0, 165, 255)  # Orange
-            thickness = 2
-
-        # Draw box
-        cv2.rectangle(frame, (x1, y1), (x2, y2), color, thickness)
-
-        # Label
-        label = f'{class_name.replace("bottle_", "").replace("defect_", "")}'
-        label_size = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)[0]
-
-        # Background for text
-        cv2.rectangle(frame, (x1, y1 - label_size[1] - 8),
-                     (x1 + label_size[0], y1), color, -1)
-        cv2.putText(frame, label, (x1, y1 - 4),
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-
-        # Confidence
-        cv2.putText(frame, f'{confidence:.2f}', (x1, y2 + 20),
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
-
-# ========== MAIN LOOP ==========
-print("\n" + "="*70)
-print(" PRODUCTION SYSTEM ACTIVE")
-print("="*70)
-print("Detection Strategy:")
-print("  - Stage 1: Detect bottle (Ron 88 or other brand)")
-print("  - Stage 2: Detect defects (multi-box capable)")
-print("  - Decision: PASS only if Ron 88 with NO defects")
-print("\nControls: Q=Quit | R=Reset | S=Stats")
-print("="*70 + "\n")
-
-try:
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        # Draw crosshair at center
-        cross_size = 20
-        cv2.line(frame, (CENTER_X - cross_size, CENTER_Y), (CENTER_X + cross_size, CENTER_Y), (0, 255, 0), 2)
-        cv2.line(frame, (CENTER_X, CENTER_Y - cross_size), (CENTER_X, CENTER_Y + cross_size), (0, 255, 0), 2)
-
-        # Draw detection zone
-        cv2.rectangle(frame, (ZONE_X1, ZONE_Y1), (ZONE_X2, ZONE_Y2),
-                     (255, 255, 0), 3)
-        cv2.putText(frame, "INSPECTION ZONE", (ZONE_X1, ZONE_Y1 - 15),
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 0), 2)
-
-        # Run detection
-        results = model.predict(frame, conf=0.3, verbose=False)  # Low conf, filter later
-
-        # Analyze detections
-        current_time = time.time()
-        bottle_type, defects, all_boxes = analyze_detections(results)
-
-        # Draw all detections
-        draw_detections(frame, all_boxes)
+        return bottle_type, defects, all_boxes
+
+    def class_threshold(self, class_id):
+        """Confidence threshold used for this class"""
+        if class_id in BOTTLE_CLASSES:
+            return self.config['bottle_confidence']
+        return self.config['defect_confidence']
+
+    def is_borderline(self, boxes_data):
+        """Check if any in-zone detection is within record_margin of its threshold"""
+        return any(abs(b['confidence'] - self.class_threshold(b['class_id'])) <= self.config['record_margin']
+                   for b in boxes_data)
+
+    def frames_disagree(self):
+        """Check if the accumulated frames disagreed on brand or defects"""
+        if len(self.accum_bottle_types) > 1:
+            return True
+        return any(n < self.accum_frame_count for n in self.accum_defect_frames.values())
+
+    def record_sample(self, zone_crop, boxes_data, reason, current_time):
+        """Queue a zone crop with labels from the detections that passed their threshold"""
+        labels = [b for b in boxes_data if b['confidence'] >= self.class_threshold(b['class_id'])]
+        self.recorder.record(zone_crop, labels, (self.zone_x1, self.zone_y1), reason, current_time)
+
+    def collect_evidence(self, zone_crop, decision):
+        """
+        Keep the zone crop in the pre-roll ring, complete strips that are waiting
+        for post-decision frames, and start a strip for a new decision.
+        Only list bookkeeping happens here; resizing and encoding run on the
+        evidence recorder's thread.
+        """
+        config = self.config
+        self.evidence_ring.append(zone_crop)
+
+        for pending in self.evidence_pending:
+            pending[3].append(zone_crop)
+            pending[5] -= 1
+        for pending in [p for p in self.evidence_pending if p[5] <= 0]:
+            self.evidence.record(*pending[:5])
+        self.evidence_pending = [p for p in self.evidence_pending if p[5] > 0]
+
+        if decision is None:
+            return
+        if decision['result'] == 'PASS' and random.random() >= config['evidence_pass_rate']:
+            return
+
+        # bottle_id has one-second resolution; the bottle number keeps names unique
+        name = f"{decision['bottle_id']}-{decision['bottle_number']:04d}"
+        caption = (f"{decision['bottle_id']} #{decision['bottle_number']} | {decision['result']} "
+                   f"{decision['bottle_type']} {decision['defects']}").strip()
+        frames = list(self.evidence_ring)
+        pending = [name, caption, decision['result'], frames, len(frames) - 1, config['evidence_post_frames']]
+        if pending[5] > 0:
+            self.evidence_pending.append(pending)
+        else:
+            self.evidence.record(*pending[:5])
+
+        # The strip may still be dropped (queue full) or evicted later (quota);
+        # the dashboard checks that the file exists
+        path = os.path.join(config['evidence_dir'], f'{name}.jpg')
+        decision['evidence'] = os.path.relpath(path, config['report_dir'])
+
+    # ========== DECISION LOGIC ==========
+
+    def process(self, detections, current_time, zone_crop=None, inspected=True):
+        """
+        Feed one frame's detections through accumulation and the decision logic.
+        Frames with inspected=False (cascade: a Ron 88 was in the zone but no
+        defect pass ran) neither start nor count toward accumulation.
+        Returns (decision, all_boxes); decision is the bottle log entry when a
+        bottle was decided on this frame, otherwise None.
+        """
+        config = self.config
+        bottle_type, defects, all_boxes = self.analyze_detections(detections)
+
+        if self.recorder and zone_crop is not None and self.is_borderline(all_boxes):
+            self.record_sample(zone_crop, all_boxes, 'borderline', current_time)
 
         # Start accumulation when bottle detected (with cooldown)
-        if bottle_type is not None and not accumulating and (current_time - last_detection_time) > DETECTION_COOLDOWN:
-            accumulating = True
-            accum_frame_count = 0
-            accum_bottle_type = bottle_type
-            accum_defects = set()
+        if (inspected and bottle_type is not None and not self.accumulating and
+                (current_time - self.last_detection_time) > config['detection_cooldown']):
+            self.accumulating = True
+            self.accum_frame_count = 0
+            self.accum_bottle_type = bottle_type
+            self.accum_defects = set()
+            self.accum_bottle_types = set()
+            self.accum_defect_frames = {}
 
         # Accumulate defects across frames
-        if accumulating:
+        if self.accumulating and inspected:
             if bottle_type is not None:
-                accum_bottle_type = bottle_type
+                self.accum_bottle_type = bottle_type
+                self.accum_bottle_types.add(bottle_type)
             for d in defects:
-                accum_defects.add(d)
-            accum_frame_count += 1
+                self.accum_defects.add(d)
+            for d in set(defects):
+                self.accum_defect_frames[d] = self.accum_defect_frames.get(d, 0) + 1
+            self.accum_frame_count += 1
 
         # Make decision after accumulating enough frames
-        if accumulating and accum_frame_count >= ACCUMULATION_FRAMES:
-            accumulating = False
-            last_detection_time = current_time
-            total_bottles += 1
-
-            is_ron88 = (accum_bottle_type == 0)
-            final_defects = sorted(accum_defects)
-
-            bottle_id = generate_bottle_id()
-            bottle_timestamp = datetime.now(timezone(timedelta(hours=7))).strftime("%Y-%m-%d %H:%M:%S")
-
-            if not is_ron88:
-                # Wrong brand - always reject
-                rejected_bottles += 1
-                wrong_brand_count += 1
-
-                if arduino:
-                    arduino.write(b'R')
-                    arduino.flush()
-
-                bottle_log.append({
-                    'bottle_id': bottle_id,
-                    'timestamp': bottle_timestamp,
-                    'bottle_number': total_bottles,
-                    'result': 'REJECT',
-                    'bottle_type': 'other_brand',
-                    'defects': 'WRONG_BRAND'
-                })
-
-                print(f"[REJECT] {bottle_id} | WRONG BRAND (not Ron 88)")
-
-                last_decision_text = "WRONG BRAND - REJECT"
-                last_decision_color = (0, 0, 255)
-
-            elif len(final_defects) > 0:
-                # Ron 88 but has defects - reject
-                rejected_bottles += 1
-
-                # Count defects (unique only)
-                defect_names = []
-                for defect_id in final_defects:
-                    if defect_id == 2:
-                        defect_stats['low_fill'] += 1
-                        defect_names.append('LOW_FILL')
-                    elif defect_id == 3:
-                        defect_stats['no_cap'] += 1
-                        defect_names.append('NO_CAP')
-                    elif defect_id == 4:
-                        defect_stats['loose_cap'] += 1
-                        defect_names.append('LOOSE_CAP')
-                    elif defect_id == 5:
-                        defect_stats['debris'] += 1
-                        defect_names.append('DEBRIS')
-                    elif defect_id == 6:
-                        defect_stats['label_damage'] += 1
-                        defect_names.append('LABEL_DMG')
-
-                # Track multi-defect bottles
-                if len(final_defects) > 1:
-                    multi_defect_bottles += 1
-
-                if arduino:
-                    arduino.write(b'R')
-                    arduino.flush()
-
-                defect_str = ' + '.join(defect_names)
-
-                bottle_log.append({
-                    'bottle_id': bottle_id,
-                    'timestamp': bottle_timestamp,
-                    'bottle_number': total_bottles,
-                    'result': 'REJECT',
-                    'bottle_type': 'ron88',
-                    'defects': defect_str
-                })
-
-                print(f"[REJECT] {bottle_id} | Ron88 DEFECTS ({defect_str})")
-
-                last_decision_text = f"DEFECT: {defect_str}"
-                last_decision_color = (0, 0, 255)
-
-            else:
-                # Perfect Ron 88 - pass
-                good_ron88 += 1
-
-                if arduino:
-                    arduino.write(b'G')
-                    arduino.flush()
-
-                bottle_log.append({
-                    'bottle_id': bottle_id,
-                    'timestamp': bottle_timestamp,
-                    'bottle_number': total_bottles,
-                    'result': 'PASS',
-                    'bottle_type': 'ron88',
-                    'defects': ''
-                })
-
-                print(f"[OK] {bottle_id} | Perfect Ron 88 (PASS #{good_ron88})")
+        decision = None
+        if self.accumulating and self.accum_frame_count >= config['accumulation_frames']:
+            if self.recorder and zone_crop is not None and self.frames_disagree():
+                self.record_sample(zone_crop, all_boxes, 'disagree', current_time)
+            decision = self.decide(current_time)
+
+        if self.evidence and zone_crop is not None:
+            self.collect_evidence(zone_crop, decision)
+
+        if self.collector and decision is not None:
+            self.record_seq += 1
+            self.collector.send({**decision, 'session': self.session_id, 'seq': self.record_seq})
+
+        return decision, all_boxes
+
+    def decide(self, current_time):
+        """Close the current accumulation window and act on the result"""
+        self.accumulating = False
+        self.last_detection_time = current_time
+        self.total_bottles += 1
+        if self.first_decision_time is None and self.cap is not None:
+            self.first_decision_time = time.time() - self.start_time + CV2_IMPORT_TIME
+            print(f"[OK] First decision {self.first_decision_time:.1f}s after launch")
+
+        is_ron88 = (self.accum_bottle_type == 0)
+        final_defects = sorted(self.accum_defects)
+
+        entry = {
+            'bottle_id': generate_bottle_id(),
+            'timestamp': datetime.now(timezone(timedelta(hours=7))).strftime("%Y-%m-%d %H:%M:%S"),
+            'bottle_number': self.total_bottles,
+            'evidence': '',
+        }
+
+        if not is_ron88:
+            # Wrong brand - always reject
+            self.rejected_bottles += 1
+            self.wrong_brand_count += 1
+            self.send_command(b'R')
+
+            entry.update(result='REJECT', bottle_type='other_brand', defects='WRONG_BRAND')
+            print(f"[REJECT] {entry['bottle_id']} | WRONG BRAND (not Ron 88)")
+
+            self.last_decision_text = "WRONG BRAND - REJECT"
+            self.last_decision_color = (0, 0, 255)
+
+        elif len(final_defects) > 0:
+            # Ron 88 but has defects - reject
+            self.rejected_bottles += 1
+
+            # Count defects (unique only)
+            defect_names = []
+            for defect_id in final_defects:
+                stat_key, label = DEFECT_LABELS[defect_id]
+                self.defect_stats[stat_key] += 1
+                defect_names.append(label)
+
+            # Track multi-defect bottles
+            if len(final_defects) > 1:
+                self.multi_defect_bottles += 1
+
+            self.send_command(b'R')
+
+            defect_str = ' + '.join(defect_names)
+            entry.update(result='REJECT', bottle_type='ron88', defects=defect_str)
+            print(f"[REJECT] {entry['bottle_id']} | Ron88 DEFECTS ({defect_str})")
+
+            self.last_decision_text = f"DEFECT: {defect_str}"
+            self.last_decision_color = (0, 0, 255)
+
+        else:
+            # Perfect Ron 88 - pass
+            self.good_ron88 += 1
+            self.send_command(b'G')
+
+            entry.update(result='PASS', bottle_type='ron88', defects='')
+            print(f"[OK] {entry['bottle_id']} | Perfect Ron 88 (PASS #{self.good_ron88})")
+
+            self.last_decision_text = "RON 88 - PASS"
+            self.last_decision_color = (0, 255, 0)
+
+        self.bottle_log.append(entry)
+        return entry
+
+    def send_command(self, command):
+        if self.arduino:
+            self.arduino.write(command)
+            self.arduino.flush()
+
+    # ========== DISPLAY ==========
+
+    def draw_guides(self, frame):
+        # Draw crosshair at center
+        cross_size = 20
+        cx, cy = self.center_x, self.center_y
+        cv2.line(frame, (cx - cross_size, cy), (cx + cross_size, cy), (0, 255, 0), 2)
+        cv2.line(frame, (cx, cy - cross_size), (cx, cy + cross_size), (0, 255, 0), 2)
 
-                last_decision_text = "RON 88 - PASS"
-                last_decision_color = (0, 255, 0)
+        # Draw detection zone
+        cv2.rectangle(frame, (self.zone_x1, self.zone_y1), (self.zone_x2, self.zone_y2),
+                     (255, 255, 0), 3)
+        cv2.putText(frame, "INSPECTION ZONE", (self.zone_x1, self.zone_y1 - 15),
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 0), 2)
 
+    def draw_detections(self, frame, boxes_data):
+        """Draw all bounding boxes with appropriate colors"""
+        for box_data in boxes_data:
+            class_id = box_data['class_id']
+            class_name = box_data['class_name']
+            confidence = box_data['confidence']
+            x1, y1, x2, y2 = box_data['bbox']
+
+            # Color coding
+            if class_id == 0:  # Ron 88 bottle
+                color = (0, 255, 0)  # Green
+                thickness = 3
+            elif class_id == 1:  # Other brand
+                color = (0, 0, 255)  # Red
+                thickness = 3
+            else:  # Defects
+                color = (0, 165, 255)  # Orange
+                thickness = 2
+
+            # Draw box
+            cv2.rectangle(frame, (x1, y1), (x2, y2), color, thickness)
+
+            # Label
+            label = f'{class_name.replace("bottle_", "").replace("defect_", "")}'
+            label_size = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)[0]
+
+            # Background for text
+            cv2.rectangle(frame, (x1, y1 - label_size[1] - 8),
+                         (x1 + label_size[0], y1), color, -1)
+            cv2.putText(frame, label, (x1, y1 - 4),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+
+            # Confidence
+            cv2.putText(frame, f'{confidence:.2f}', (x1, y2 + 20),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+
+    def draw_overlay(self, frame):
         # ========== STATISTICS OVERLAY ==========
         # Status indicator
-        status_color = (0, 255, 0) if arduino else (0, 100, 255)
-        status = "ACTIVE" if arduino else "TEST MODE"
+        status_color = (0, 255, 0) if self.arduino else (0, 100, 255)
+        status = "ACTIVE" if self.arduino else "TEST MODE"
 
         # Calculate panel height dynamically
         panel_h = 330
@@ -405,20 +832,20 @@ try:
         cv2.line(frame, (18, y - 6), (310, y - 6), (80, 80, 80), 1)
 
         # Main stats
-        cv2.putText(frame, f"Total:       {total_bottles}", (18, y),
+        cv2.putText(frame, f"Total:       {self.total_bottles}", (18, y),
                    cv2.FONT_HERSHEY_SIMPLEX, 0.55, (255, 255, 255), 1)
         y += gap
 
-        cv2.putText(frame, f"Good:        {good_ron88}", (18, y),
+        cv2.putText(frame, f"Good:        {self.good_ron88}", (18, y),
                    cv2.FONT_HERSHEY_SIMPLEX, 0.55, (0, 255, 0), 1)
         y += gap
 
-        cv2.putText(frame, f"Rejected:    {rejected_bottles}", (18, y),
+        cv2.putText(frame, f"Rejected:    {self.rejected_bottles}", (18, y),
                    cv2.FONT_HERSHEY_SIMPLEX, 0.55, (0, 0, 255), 1)
         y += gap
 
-        if total_bottles > 0:
-            quality_rate = (good_ron88 / total_bottles) * 100
+        if self.total_bottles > 0:
+            quality_rate = (self.good_ron88 / self.total_bottles) * 100
             q_color = (0, 255, 0) if quality_rate >= 90 else (0, 165, 255) if quality_rate >= 70 else (0, 0, 255)
             cv2.putText(frame, f"Quality:     {quality_rate:.1f}%", (18, y),
                        cv2.FONT_HERSHEY_SIMPLEX, 0.55, q_color, 1)
@@ -433,12 +860,12 @@ try:
         y += gap - 2
 
         defect_items = [
-            (f"Brand:  {wrong_brand_count}", (255, 100, 100)),
-            (f"Fill:   {defect_stats['low_fill']}", (255, 150, 100)),
-            (f"NoCap:  {defect_stats['no_cap']}", (255, 150, 100)),
-            (f"Loose:  {defect_stats['loose_cap']}", (255, 150, 100)),
-            (f"Debris: {defect_stats['debris']}", (255, 150, 100)),
-            (f"Label:  {defect_stats['label_damage']}", (255, 150, 100)),
+            (f"Brand:  {self.wrong_brand_count}", (255, 100, 100)),
+            (f"Fill:   {self.defect_stats['low_fill']}", (255, 150, 100)),
+            (f"NoCap:  {self.defect_stats['no_cap']}", (255, 150, 100)),
+            (f"Loose:  {self.defect_stats['loose_cap']}", (255, 150, 100)),
+            (f"Debris: {self.defect_stats['debris']}", (255, 150, 100)),
+            (f"Label:  {self.defect_stats['label_damage']}", (255, 150, 100)),
         ]
 
         # Render defects in 2 columns
@@ -449,134 +876,265 @@ try:
                        cv2.FONT_HERSHEY_SIMPLEX, 0.45, color, 1)
 
         # Decision status (bottom-right, persistent)
-        if last_decision_text:
-            text_size = cv2.getTextSize(last_decision_text, cv2.FONT_HERSHEY_SIMPLEX, 1.0, 3)[0]
-            text_x = FRAME_WIDTH - text_size[0] - 20
-            text_y = FRAME_HEIGHT - 25
+        if self.last_decision_text:
+            text_size = cv2.getTextSize(self.last_decision_text, cv2.FONT_HERSHEY_SIMPLEX, 1.0, 3)[0]
+            text_x = self.frame_width - text_size[0] - 20
+            text_y = self.frame_height - 25
             # Background for readability
             dec_overlay = frame.copy()
             cv2.rectangle(dec_overlay, (text_x - 10, text_y - text_size[1] - 10),
-                         (FRAME_WIDTH - 5, text_y + 10), (0, 0, 0), -1)
+                         (self.frame_width - 5, text_y + 10), (0, 0, 0), -1)
             cv2.addWeighted(dec_overlay, 0.3, frame, 0.7, 0, frame)
-            cv2.putText(frame, last_decision_text, (text_x, text_y),
-                       cv2.FONT_HERSHEY_SIMPLEX, 1.0, last_decision_color, 3)
-
-        # Display
-        cv2.imshow('Ron 88 Production Quality Control', frame)
-
-        # Controls
-        key = cv2.waitKey(1) & 0xFF
-
-        if key == ord('q'):
-            break
-        elif key == ord('r'):
-            total_bottles = 0
-            good_ron88 = 0
-            rejected_bottles = 0
-            wrong_brand_count = 0
-            defect_stats = {k: 0 for k in defect_stats}
-            multi_defect_bottles = 0
-            bottle_log = []
-            accumulating = False
-            accum_frame_count = 0
-            accum_defects = set()
-            last_decision_text = ""
-            print("\n Statistics reset!\n")
-        elif key == ord('s'):
-            print("\n" + "="*70)
-            print(" PRODUCTION STATISTICS")
-            print("="*70)
-            print(f"Total inspected:     {total_bottles}")
-            print(f"Good Ron 88:         {good_ron88}")
-            print(f"Rejected:            {rejected_bottles}")
-            if total_bottles > 0:
-                print(f"Quality rate:        {(good_ron88/total_bottles)*100:.1f}%")
-                print(f"Rejection rate:      {(rejected_bottles/total_bottles)*100:.1f}%")
-            print("\nRejection breakdown:")
-            print(f"  Wrong brand:       {wrong_brand_count}")
-            print(f"  Low fill:          {defect_stats['low_fill']}")
-            print(f"  No cap:            {defect_stats['no_cap']}")
-            print(f"  Loose cap:         {defect_stats['loose_cap']}")
-            print(f"  Debris:            {defect_stats['debris']}")
-            print(f"  Label damage:      {defect_stats['label_damage']}")
-            print(f"  Multi-defect:      {multi_defect_bottles}")
-            print("="*70 + "\n")
-
-except KeyboardInterrupt:
-    print("\n\n[WARN] Interrupted")
-
-finally:
-    print("\n Shutting down...")
-    cap.release()
-    if arduino:
-        arduino.close()
-    cv2.destroyAllWindows()
-
-    # Final report
-    print("\n" + "="*70)
-    print(" FINAL PRODUCTION REPORT")
-    print("="*70)
-    print(f"Session duration: {time.time() - session_start_time:.0f}s")
-    print(f"Total inspected:  {total_bottles}")
-    print(f"Good Ron 88:      {good_ron88}")
-    print(f"Rejected:         {rejected_bottles}")
-    if total_bottles > 0:
-        print(f"Quality rate:     {(good_ron88/total_bottles)*100:.1f}%")
-
-    if rejected_bottles > 0:
-        print("\nDefect analysis:")
-        total_defects = sum(defect_stats.values())
-        for defect, count in defect_stats.items():
-            if count > 0:
-                print(f"  {defect:15s}: {count:3d} ({count/total_defects*100:5.1f}%)")
-        print(f"  wrong_brand:     {wrong_brand_count:3d}")
-        print(f"\nMulti-defect bottles: {multi_defect_bottles}")
-
-    # Save report to CSV
-    REPORT_DIR = r'C:\Users\jihad\D\! All\! Project\23. Conveyor Belt\inference_result'
-    os.makedirs(REPORT_DIR, exist_ok=True)
-
-    timestamp = datetime.now(timezone(timedelta(hours=7))).strftime("%Y%m%d_%H%M%S")
-    duration = time.time() - session_start_time
-    quality_rate = (good_ron88 / total_bottles * 100) if total_bottles > 0 else 0.0
-
-    # Save per-bottle detail report
-    csv_path = os.path.join(REPORT_DIR, f'report_{timestamp}.csv')
-    with open(csv_path, 'w', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow(['bottle_id', 'timestamp', 'bottle_number', 'result', 'bottle_type', 'defects'])
-        for entry in bottle_log:
-            writer.writerow([
-                entry['bottle_id'],
-                entry['timestamp'],
-                entry['bottle_number'],
-                entry['result'],
-                entry['bottle_type'],
-                entry['defects']
-            ])
-
-    # Save summary report
-    summary_path = os.path.join(REPORT_DIR, f'summary_{timestamp}.csv')
-    with open(summary_path, 'w', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow(['metric', 'value'])
-        writer.writerow(['session_date', datetime.now(timezone(timedelta(hours=7))).strftime("%Y-%m-%d %H:%M:%S")])
-        writer.writerow(['session_duration_s', f'{duration:.0f}'])
-        writer.writerow(['total_inspected', total_bottles])
-        writer.writerow(['good_ron88', good_ron88])
-        writer.writerow(['rejected', rejected_bottles])
-        writer.writerow(['quality_rate_%', f'{quality_rate:.1f}'])
-        writer.writerow(['wrong_brand', wrong_brand_count])
-        writer.writerow(['defect_low_fill', defect_stats['low_fill']])
-        writer.writerow(['defect_no_cap', defect_stats['no_cap']])
-        writer.writerow(['defect_loose_cap', defect_stats['loose_cap']])
-        writer.writerow(['defect_debris', defect_stats['debris']])
-        writer.writerow(['defect_label_damage', defect_stats['label_damage']])
-        writer.writerow(['multi_defect_bottles', multi_defect_bottles])
-
-    print(f"\n[OK] Bottle log saved: {csv_path}")
-    print(f"[OK] Summary saved:    {summary_path}")
-
-    print("="*70)
-    print("[OK] Production system shut down")
-    print("="*70)
+            cv2.putText(frame, self.last_decision_text, (text_x, text_y),
+                       cv2.FONT_HERSHEY_SIMPLEX, 1.0, self.last_decision_color, 3)
+
+    # ========== MAIN LOOP ==========
+
+    def run(self):
+        config = self.config
+        print("\n" + "="*70)
+        print(" PRODUCTION SYSTEM ACTIVE")
+        print("="*70)
+        print("Detection Strategy:")
+        print("  - Stage 1: Detect bottle (Ron 88 or other brand)")
+        print("  - Stage 2: Detect defects (multi-box capable)")
+        print("  - Decision: PASS only if Ron 88 with NO defects")
+        if not config['headless']:
+            print("\nControls: Q=Quit | R=Reset | S=Stats")
+        print("="*70 + "\n")
+
+        while config['max_frames'] is None or self.frames < config['max_frames']:
+            ret, frame = self.cap.read()
+            if not ret:
+                break
+            self.frames += 1
+
+            # Clean zone crop for the sample / evidence recorders (before any overlay is drawn)
+            zone_crop = None
+            if self.recorder or self.evidence:
+                zone_crop = frame[self.zone_y1:self.zone_y2, self.zone_x1:self.zone_x2].copy()
+
+            # Run detection (on the raw frame; guides are drawn afterwards)
+            detections = self.detect(frame)
+
+            # Analyze detections and decide
+            current_time = time.time()
+            _, all_boxes = self.process(detections, current_time, zone_crop,
+                                        inspected=not self.defect_pass_skipped)
+
+            if config['headless']:
+                continue
+
+            # Draw guides and all detections
+            self.draw_guides(frame)
+            self.draw_detections(frame, all_boxes)
+            self.draw_overlay(frame)
+
+            # Display
+            cv2.imshow('Ron 88 Production Quality Control', frame)
+
+            # Controls
+            key = cv2.waitKey(1) & 0xFF
+
+            if key == ord('q'):
+                break
+            elif key == ord('r'):
+                self.reset_stats()
+                print("\n Statistics reset!\n")
+            elif key == ord('s'):
+                self.print_stats()
+
+    # ========== SHUTDOWN ==========
+
+    def shutdown(self, save_reports=True):
+        print("\n Shutting down...")
+        if self.cap:
+            self.cap.release()
+        if self.arduino:
+            self.arduino.close()
+        if self.recorder:
+            self.recorder.close()
+        if self.evidence:
+            # Bottles still waiting for post-decision frames get the frames they have
+            for pending in self.evidence_pending:
+                self.evidence.record(*pending[:5])
+            self.evidence_pending = []
+            self.evidence.close()
+        if self.collector:
+            self.collector.close()
+        if not self.config['headless']:
+            cv2.destroyAllWindows()
+
+        # Final report
+        print("\n" + "="*70)
+        print(" FINAL PRODUCTION REPORT")
+        print("="*70)
+        print(f"Session duration: {time.time() - self.session_start_time:.0f}s")
+        print(f"Total inspected:  {self.total_bottles}")
+        print(f"Good Ron 88:      {self.good_ron88}")
+        print(f"Rejected:         {self.rejected_bottles}")
+        if self.total_bottles > 0:
+            print(f"Quality rate:     {(self.good_ron88/self.total_bottles)*100:.1f}%")
+
+        if self.rejected_bottles > 0:
+            print("\nDefect analysis:")
+            total_defects = sum(self.defect_stats.values())
+            for defect, count in self.defect_stats.items():
+                if count > 0:
+                    print(f"  {defect:15s}: {count:3d} ({count/total_defects*100:5.1f}%)")
+            print(f"  wrong_brand:     {self.wrong_brand_count:3d}")
+            print(f"\nMulti-defect bottles: {self.multi_defect_bottles}")
+
+        if self.config['cascade'] and self.frames > 0:
+            print(f"\nCascade: defect pass on {self.defect_passes}/{self.frames} frames "
+                  f"({self.defect_passes / self.frames * 100:.1f}%)")
+
+        if self.recorder:
+            rec = self.recorder.stats()
+            print(f"\nSamples recorded: {rec['written']} "
+                  f"(rate-limited {rec['rate_limited']}, dropped {rec['dropped']}, "
+                  f"over quota {rec['over_quota']}, {rec['disk_mb']:.0f} MB on disk)")
+
+        if self.evidence:
+            ev = self.evidence.stats()
+            print(f"Evidence strips:  {ev['written']} "
+                  f"(dropped {ev['dropped']}, evicted {ev['evicted']}, {ev['disk_mb']:.0f} MB on disk)")
+
+        if self.collector:
+            col = self.collector.stats()
+            print(f"Collector:        {col['sent']} records sent "
+                  f"(dropped {col['dropped']}, {col['pending_batches']} batches spooled, "
+                  f"evicted {col['evicted']})")
+
+        if save_reports:
+            self.save_reports()
+
+        print("="*70)
+        print("[OK] Production system shut down")
+        print("="*70)
+
+    def save_reports(self):
+        """Save the per-bottle log and session summary CSVs"""
+        report_dir = self.config['report_dir']
+        os.makedirs(report_dir, exist_ok=True)
+
+        timestamp = datetime.now(timezone(timedelta(hours=7))).strftime("%Y%m%d_%H%M%S")
+        duration = time.time() - self.session_start_time
+        quality_rate = (self.good_ron88 / self.total_bottles * 100) if self.total_bottles > 0 else 0.0
+
+        # Save per-bottle detail report
+        csv_path = os.path.join(report_dir, f'report_{timestamp}.csv')
+        with open(csv_path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['bottle_id', 'timestamp', 'bottle_number', 'result', 'bottle_type', 'defects',
+                             'evidence'])
+            for entry in self.bottle_log:
+                writer.writerow([
+                    entry['bottle_id'],
+                    entry['timestamp'],
+                    entry['bottle_number'],
+                    entry['result'],
+                    entry['bottle_type'],
+                    entry['defects'],
+                    entry['evidence']
+                ])
+
+        # Save summary report
+        summary_path = os.path.join(report_dir, f'summary_{timestamp}.csv')
+        with open(summary_path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['metric', 'value'])
+            writer.writerow(['session_date', datetime.now(timezone(timedelta(hours=7))).strftime("%Y-%m-%d %H:%M:%S")])
+            writer.writerow(['session_duration_s', f'{duration:.0f}'])
+            writer.writerow(['total_inspected', self.total_bottles])
+            writer.writerow(['good_ron88', self.good_ron88])
+            writer.writerow(['rejected', self.rejected_bottles])
+            writer.writerow(['quality_rate_%', f'{quality_rate:.1f}'])
+            writer.writerow(['wrong_brand', self.wrong_brand_count])
+            writer.writerow(['defect_low_fill', self.defect_stats['low_fill']])
+            writer.writerow(['defect_no_cap', self.defect_stats['no_cap']])
+            writer.writerow(['defect_loose_cap', self.defect_stats['loose_cap']])
+            writer.writerow(['defect_debris', self.defect_stats['debris']])
+            writer.writerow(['defect_label_damage', self.defect_stats['label_damage']])
+            writer.writerow(['multi_defect_bottles', self.multi_defect_bottles])
+            for step, seconds in self.startup_timings.items():
+                writer.writerow([f'startup_{step}_s', f'{seconds:.2f}'])
+            if self.first_decision_time is not None:
+                writer.writerow(['first_decision_s', f'{self.first_decision_time:.2f}'])
+
+        print(f"\n[OK] Bottle log saved: {csv_path}")
+        print(f"[OK] Summary saved:    {summary_path}")
+
+
+# ========== COMMAND LINE ==========
+
+def parse_value(text):
+    """Parse a --set value as JSON (numbers, true/false, null), falling back to a string"""
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def parse_set(items):
+    """['imgsz=320', 'headless=true'] -> {'imgsz': 320, 'headless': True}"""
+    overrides = {}
+    for item in items:
+        key, sep, value = item.partition('=')
+        if not sep:
+            raise ValueError(f"--set expects KEY=VALUE, got '{item}'")
+        overrides[key.strip()] = parse_value(value)
+    return overrides
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Ron 88 defect-level quality inspection")
+    parser.add_argument('--config', default=CONFIG_PATH, help="JSON config file (default: config/production.json)")
+    parser.add_argument('--model', dest='model_path', help="Model file (.pt, .onnx, ...)")
+    parser.add_argument('--port', dest='arduino_port', help="Arduino serial port")
+    parser.add_argument('--no-arduino', action='store_true', help="Run in TEST MODE without opening a serial port")
+    parser.add_argument('--camera', dest='camera_index', type=int, help="Camera index")
+    parser.add_argument('--source', help="Video file instead of the camera")
+    parser.add_argument('--imgsz', type=int, help="Model input size")
+    parser.add_argument('--device', help="Inference device, e.g. cpu or 0")
+    parser.add_argument('--threads', type=int, help="torch CPU threads")
+    parser.add_argument('--headless', action='store_true', default=None, help="No preview window")
+    parser.add_argument('--max-frames', type=int, help="Stop after this many frames")
+    parser.add_argument('--set', action='append', default=[], metavar='KEY=VALUE',
+                        help="Override any config key, e.g. --set bottle_confidence=0.75")
+    return parser.parse_args(argv)
+
+
+def config_from_args(args):
+    overrides = {key: value for key, value in vars(args).items()
+                 if key not in ('config', 'no_arduino', 'set') and value is not None}
+    if args.no_arduino:
+        overrides['arduino_port'] = None
+    overrides.update(parse_set(args.set))
+    return load_config(args.config, overrides)
+
+
+def main(argv=None):
+    try:
+        config = config_from_args(parse_args(argv))
+    except ValueError as e:
+        print(f"[ERROR] ERROR: {e}")
+        sys.exit(1)
+
+    pipeline = InspectionPipeline(config)
+    try:
+        pipeline.start()
+    except Exception as e:
+        print(f"[ERROR] ERROR: {e}")
+        sys.exit(1)
+
+    try:
+        pipeline.run()
+    except KeyboardInterrupt:
+        print("\n\n[WARN] Interrupted")
+    finally:
+        pipeline.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+# RON 88 SAMPLE RECORDER
+# Saves borderline / disagreeing production frames as YOLO-format training samples
+
+import os
+from datetime import datetime, timezone, timedelta
+
+import cv2
+
+from background_writer import BackgroundWriter
+
+
+class SampleRecorder(BackgroundWriter):
+    """
+    Record zone crops plus YOLO labels from the current detections.
+
+    Output layout (ready to review in CVAT and merge into the dataset):
+        <output_dir>/images/<reason>_<timestamp>_<seq>.jpg
+        <output_dir>/labels/<reason>_<timestamp>_<seq>.txt
+    """
+
+    def __init__(self, output_dir, min_interval=1.0, queue_size=16, max_bytes=None):
+        super().__init__(output_dir, queue_size=queue_size, max_bytes=max_bytes,
+                         name='sample-recorder')
+        self.min_interval = min_interval
+        self.rate_limited = 0
+        self._last_record_time = {}  # Per reason, so frequent borderline saves can't starve disagree
+        self._seq = 0
+
+    def start(self):
+        os.makedirs(os.path.join(self.output_dir, 'images'), exist_ok=True)
+        os.makedirs(os.path.join(self.output_dir, 'labels'), exist_ok=True)
+        return super().start()
+
+    def record(self, crop, boxes_data, origin, reason, now):
+        """
+        Queue one sample. crop is the zone image, boxes_data the detections to
+        use as labels (frame coordinates) and origin the crop's top-left corner.
+        Returns True if the sample was queued.
+        """
+        if now - self._last_record_time.get(reason, 0) < self.min_interval:
+            self.rate_limited += 1
+            return False
+
+        self._seq += 1
+        timestamp = datetime.now(timezone(timedelta(hours=7))).strftime("%Y%m%d_%H%M%S")
+        name = f'{reason}_{timestamp}_{self._seq:04d}'
+        boxes = [(b['class_id'], b['bbox']) for b in boxes_data]
+
+        if self.submit((name, crop, boxes, origin)):
+            self._last_record_time[reason] = now
+            return True
+        return False
+
+    def write_job(self, job):
+        name, crop, boxes, (ox, oy) = job
+        h, w = crop.shape[:2]
+
+        # YOLO format: class cx cy w h, normalized to the crop
+        lines = []
+        for class_id, (x1, y1, x2, y2) in boxes:
+            x1, x2 = max(0, x1 - ox), min(w, x2 - ox)
+            y1, y2 = max(0, y1 - oy), min(h, y2 - oy)
+            if x2 <= x1 or y2 <= y1:
+                continue
+            lines.append(f'{class_id} {(x1 + x2) / 2 / w:.6f} {(y1 + y2) / 2 / h:.6f} '
+                         f'{(x2 - x1) / w:.6f} {(y2 - y1) / h:.6f}\n')
+        label_data = ''.join(lines).encode()
+
+        ok, buf = cv2.imencode('.jpg', crop, [cv2.IMWRITE_JPEG_QUALITY, 95])
+        if not ok:
+            raise RuntimeError(f'JPEG encoding failed for {name}')
+        image_data = buf.tobytes()
+
+        if not self.reserve(len(image_data) + len(label_data)):
+            return 0
+
+        with open(os.path.join(self.output_dir, 'images', f'{name}.jpg'), 'wb') as f:
+            f.write(image_data)
+        with open(os.path.join(self.output_dir, 'labels', f'{name}.txt'), 'wb') as f:
+            f.write(label_data)
+        return len(image_data) + len(label_data)
+
+    def stats(self):
+        stats = super().stats()
+        stats['rate_limited'] = self.rate_limited
+        return stats
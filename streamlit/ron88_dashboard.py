@@ -3,11 +3,16 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 import glob
+import json
 import os
+import urllib.parse
+import urllib.request
+from datetime import date, timedelta
 
 # ========== CONFIG ==========
 
 REPORT_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'inference_result')
+COLLECTOR_URL = os.environ.get('RON88_COLLECTOR_URL', 'http://127.0.0.1:8765')
 
 st.set_page_config(
     page_title="Ron 88 QC Dashboard",
@@ -72,26 +77,79 @@ st.markdown("""
 
 # ========== LOAD DATA ==========
 
-report_files = sorted(glob.glob(os.path.join(REPORT_DIR, 'report_*.csv')), reverse=True)
+@st.cache_data(ttl=10)
+def fetch_collector(path, **params):
+    """GET a JSON endpoint of the collector (script/collector.py)"""
+    url = f"{COLLECTOR_URL}{path}?{urllib.parse.urlencode(params, doseq=True)}"
+    with urllib.request.urlopen(url, timeout=5) as response:
+        return json.load(response)
 
-if not report_files:
-    st.warning("No report files found in `inference_result/` folder.")
-    st.stop()
-
-# Sidebar
 with st.sidebar:
-    st.header("Session")
-    selected = st.selectbox(
-        "Select report file",
-        report_files,
-        format_func=lambda x: os.path.basename(x).replace('report_', '').replace('.csv', '').replace('_', ' @ '),
-    )
-
-    # Check for matching summary file
-    summary_file = selected.replace('report_', 'summary_')
-    has_summary = os.path.exists(summary_file)
+    source = st.radio("Data source", ["Local reports", "Collector (all stations)"])
+
+if source == "Local reports":
+    report_files = sorted(glob.glob(os.path.join(REPORT_DIR, 'report_*.csv')), reverse=True)
+
+    if not report_files:
+        st.warning("No report files found in `inference_result/` folder.")
+        st.stop()
+
+    # Sidebar
+    with st.sidebar:
+        st.header("Session")
+        selected = st.selectbox(
+            "Select report file",
+            report_files,
+            format_func=lambda x: os.path.basename(x).replace('report_', '').replace('.csv', '').replace('_', ' @ '),
+        )
 
-df = pd.read_csv(selected)
+        # Check for matching summary file
+        summary_file = selected.replace('report_', 'summary_')
+        has_summary = os.path.exists(summary_file)
+
+    df = pd.read_csv(selected)
+    evidence_base = os.path.dirname(selected)
+else:
+    try:
+        stations = fetch_collector('/stations')['stations']
+    except OSError as e:
+        st.warning(f"Collector not reachable at `{COLLECTOR_URL}` ({e}). Start it with `python script/collector.py`.")
+        st.stop()
+
+    if not stations:
+        st.warning("The collector has no records yet.")
+        st.stop()
+
+    # Sidebar
+    with st.sidebar:
+        st.header("Stations")
+        station_names = [s['station'] for s in stations]
+        selected_stations = st.multiselect("Stations", station_names, default=station_names)
+        date_range = st.date_input("Date range", value=(date.today() - timedelta(days=6), date.today()))
+        if st.button("Refresh"):
+            fetch_collector.clear()
+
+    # An empty station filter would otherwise query every station
+    if not selected_stations:
+        st.info("Select at least one station.")
+        st.stop()
+
+    # The range picker returns a one-element tuple while the second date is being chosen
+    if isinstance(date_range, tuple):
+        start_date, end_date = (date_range[0], date_range[-1]) if date_range else (date.today(), date.today())
+    else:
+        start_date = end_date = date_range
+    try:
+        records = fetch_collector('/records', station=selected_stations,
+                                  start=f'{start_date} 00:00:00', end=f'{end_date} 23:59:59')['records']
+    except OSError as e:
+        st.warning(f"Collector not reachable at `{COLLECTOR_URL}` ({e}). Start it with `python script/collector.py`.")
+        st.stop()
+    df = pd.DataFrame(records, columns=['station', 'session', 'seq', 'bottle_id', 'timestamp', 'bottle_number',
+                                        'result', 'bottle_type', 'defects', 'evidence'])
+    has_summary = False
+    # Evidence paths are relative to each station's own report folder; only this PC's are viewable
+    evidence_base = REPORT_DIR
 
 if df.empty:
     st.info("This report has no bottle data.")
@@ -99,6 +157,14 @@ if df.empty:
 
 df['defects'] = df['defects'].fillna('')
 
+# Evidence strips (reports from older sessions have no evidence column); paths are
+# relative to the report folder and may have been evicted by the disk quota
+if 'evidence' not in df.columns:
+    df['evidence'] = ''
+df['evidence'] = df['evidence'].fillna('').map(
+    lambda p: os.path.join(evidence_base, p) if p else '')
+df['evidence'] = df['evidence'].where(df['evidence'].map(os.path.exists), '')
+
 # ========== SUMMARY METRICS ==========
 
 total = len(df)
@@ -118,7 +184,24 @@ if has_summary:
     summary_dict = dict(zip(summary_df['metric'], summary_df['value']))
     duration = summary_dict.get('session_duration_s', '?')
     session_date = summary_dict.get('session_date', '?')
-    st.caption(f"Session: {session_date}  ·  Duration: {duration}s")
+    caption = f"Session: {session_date}  ·  Duration: {duration}s"
+    if 'startup_total_s' in summary_dict:
+        caption += f"  ·  Start-up: {summary_dict['startup_total_s']}s"
+    if 'first_decision_s' in summary_dict:
+        caption += f"  ·  First decision: {summary_dict['first_decision_s']}s"
+    st.caption(caption)
+
+# Per-station breakdown when viewing several lines from the collector
+if 'station' in df.columns and df['station'].nunique() > 1:
+    station_df = df.groupby('station').agg(
+        total=('result', 'size'),
+        passed=('result', lambda r: (r == 'PASS').sum()),
+        rejected=('result', lambda r: (r == 'REJECT').sum()),
+        last_bottle=('timestamp', 'max'),
+    ).reset_index()
+    station_df['quality_rate'] = (station_df['passed'] / station_df['total'] * 100).round(1)
+    station_df.columns = ['Station', 'Inspected', 'Passed', 'Rejected', 'Last bottle', 'Quality Rate %']
+    st.dataframe(station_df, use_container_width=True, hide_index=True)
 
 st.divider()
 
@@ -186,13 +269,20 @@ filter_col1, filter_col2 = st.columns([1, 4])
 with filter_col1:
     result_filter = st.selectbox("Filter by result", ["All", "PASS", "REJECT"])
 
-display_df = df[['bottle_id', 'timestamp', 'bottle_number', 'result', 'bottle_type', 'defects']].copy()
+log_columns = ['bottle_id', 'timestamp', 'bottle_number', 'result', 'bottle_type', 'defects', 'evidence']
+log_headers = ['Bottle ID', 'Timestamp', '#', 'Result', 'Type', 'Defects', 'Evidence']
+if 'station' in df.columns:
+    log_columns.insert(0, 'station')
+    log_headers.insert(0, 'Station')
+
+display_df = df[log_columns].copy()
 display_df['defects'] = display_df['defects'].replace('', '-')
+display_df['evidence'] = display_df['evidence'].map(lambda p: '📷' if p else '')
 
 if result_filter != "All":
     display_df = display_df[display_df['result'] == result_filter]
 
-display_df.columns = ['Bottle ID', 'Timestamp', '#', 'Result', 'Type', 'Defects']
+display_df.columns = log_headers
 
 def highlight_result(row):
     if row['Result'] == 'PASS':
@@ -207,3 +297,21 @@ st.dataframe(
 )
 
 st.caption(f"Showing {len(display_df)} of {total} bottles")
+
+# ========== EVIDENCE VIEWER ==========
+
+evidence_df = df[df['evidence'] != '']
+if result_filter != "All":
+    evidence_df = evidence_df[evidence_df['result'] == result_filter]
+
+if not evidence_df.empty:
+    st.subheader("Evidence")
+    evidence_rows = evidence_df.to_dict('records')
+    chosen = st.selectbox(
+        "Bottle",
+        range(len(evidence_rows)),
+        format_func=lambda i: (f"#{evidence_rows[i]['bottle_number']}  {evidence_rows[i]['bottle_id']}  "
+                               f"{evidence_rows[i]['result']}  {evidence_rows[i]['defects'] or ''}"),
+    )
+    st.image(evidence_rows[chosen]['evidence'], use_container_width=True,
+             caption="Zone crops around the decision (DECISION = frame the bottle was decided on)")